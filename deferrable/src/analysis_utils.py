@@ -3,19 +3,66 @@ import pickle
 import numpy as np
 import matplotlib.pyplot as plt
 import matplotlib.cm as cm
+from dataset_store import SUFFIX, PickledDataset, columnar_path, is_columnar_dataset, open_columnar_dataset
+
+# datasets opened in this process, by path, with the mtime they were read at
+_dataset_cache = {}
+
+def dataset_mtime(path):
+    """Modification time of a dataset; a columnar dataset's header is written last"""
+    return os.stat(os.path.join(path, "header.json") if os.path.isdir(path) else path).st_mtime_ns
+
+def read_dataset(path):
+    """
+    Samples of a dataset file, opened once per process: a memory-mapped
+    ColumnarDataset for a columnar dataset, a PickledDataset otherwise. Both give
+    dict rows by index and whole columns through series(name) and scalar(name).
+    The dataset is read again only if the file changed.
+    """
+    path = os.path.abspath(path)
+    mtime = dataset_mtime(path)
+    cached = _dataset_cache.get(path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    if is_columnar_dataset(path):
+        data = open_columnar_dataset(path)
+    else:
+        with open(path, "rb") as f:
+            data = PickledDataset(pickle.load(f))
+    _dataset_cache[path] = (mtime, data)
+    return data
+
+def dataset_key(path):
+    """Policy key of a dataset path"""
+    name = os.path.basename(path)
+    for suffix in ("_dataset.pkl", "_dataset" + SUFFIX):
+        if name.endswith(suffix):
+            return name[:-len(suffix)]
+    return name
+
+def list_datasets(dataset_dir="datasets"):
+    """Dataset paths in dataset_dir, one per policy, preferring the columnar copy of a pickle"""
+    paths = {}
+    for f in sorted(os.listdir(dataset_dir)):
+        path = os.path.join(dataset_dir, f)
+        if f.endswith("_dataset" + SUFFIX) and is_columnar_dataset(path):
+            paths[dataset_key(path)] = path
+        elif f.endswith("_dataset.pkl"):
+            paths.setdefault(dataset_key(path), path)
+    return [paths[key] for key in sorted(paths)]
 
 def load_dataset(policy, dataset_dir="datasets"):
     """
-    Load the dataset pickle for a given policy.
+    Load the dataset (columnar if available, else the pickle) for a given policy.
     Returns None if file doesn't exist.
     """
     path = os.path.join(dataset_dir, f"{policy}_dataset.pkl")
+    if is_columnar_dataset(columnar_path(path)):
+        return read_dataset(columnar_path(path))
     if not os.path.exists(path):
         print(f"Warning: Dataset file not found: {path}")
         return None
-    with open(path, "rb") as f:
-        data = pickle.load(f)
-    return data
+    return read_dataset(path)
 
 def inspect_row(policy, row_index, dataset_dir="datasets", output_dir="plots"):
     """
@@ -24,9 +71,8 @@ def inspect_row(policy, row_index, dataset_dir="datasets", output_dir="plots"):
       - Saves a PDF plot of d_power
     """
     data = load_dataset(policy, dataset_dir)
-    entry = data[row_index]
-    d_power = entry["d_power"]
-    waiting = entry["waiting_time"]
+    d_power = data.series("d_power")[row_index]
+    waiting = data.scalar("waiting_time")[row_index]
     print(f"Policy: {policy}, Row: {row_index}, Waiting time: {waiting}")
 
     os.makedirs(output_dir, exist_ok=True)
@@ -47,7 +93,7 @@ def plot_waiting_hist(policy, dataset_dir="datasets", output_dir="plots", bins=5
     data = load_dataset(policy, dataset_dir)
     if data is None:
         return
-    waiting_times = [entry["waiting_time"] for entry in data]
+    waiting_times = data.scalar("waiting_time")
 
     os.makedirs(output_dir, exist_ok=True)
     fig, ax = plt.subplots()
@@ -75,9 +121,9 @@ def plot_sample_d_powers(policy, dataset_dir="datasets", output_dir="plots", num
 
     os.makedirs(output_dir, exist_ok=True)
     fig, ax = plt.subplots()
+    d_powers = data.series("d_power")
     for idx in indices:
-        dp = data[idx]["d_power"]
-        ax.plot(dp, alpha=0.7)
+        ax.plot(d_powers[idx], alpha=0.7)
     ax.set_xlabel("Window index")
     ax.set_ylabel("d_power")
     ax.set_title(f"{policy} — Sample {len(indices)} d_power Time Series")
@@ -106,18 +152,15 @@ def plot_sample_d_powers_colormap(
         np.random.seed(seed)
     indices = np.random.choice(n, size=min(num_samples, n), replace=False)
 
-    waits = np.array([data[idx]["waiting_time"]/24 for idx in indices])
+    waits = data.scalar("waiting_time")[indices] / 24
     norm = plt.Normalize(vmin=waits.min(), vmax=waits.max())
     cmap = cm.get_cmap('viridis')
 
     os.makedirs(output_dir, exist_ok=True)
     fig, ax = plt.subplots(figsize=(8, 4))
-    for idx in indices:
-        if delta:
-            dp = -np.array(data[idx]["d_power"])
-        else:
-            dp = data[idx]["pol_usage"]
-        w = data[idx]["waiting_time"] / 24
+    series = data.series("d_power" if delta else "pol_usage")
+    for idx, w in zip(indices, waits):
+        dp = -np.array(series[idx]) if delta else series[idx]
         color = cmap(norm(w))
         ax.plot(dp, color=color, alpha=0.9)
     ax.set_xlabel("Window index")
@@ -138,14 +181,14 @@ def plot_sample_d_powers_colormap(
     print(f"Saved colored sample d_power time series to {pdf_path}")
 
 def summarize_dataset(path):
-    with open(path, 'rb') as f:
-        data = pickle.load(f)
-    waiting_times = np.array([item['waiting_time'] for item in data])
-    d_means = np.array([np.mean(item['d_power']) for item in data])
-    d_maxs = np.array([np.max(item['d_power']) for item in data])
-    d_mins = np.array([np.min(item['d_power']) for item in data])
+    data = read_dataset(path)
+    waiting_times = np.asarray(data.scalar('waiting_time'))
+    d_power = data.series('d_power')
+    d_means = d_power.mean(axis=1, dtype=np.float64)
+    d_maxs = d_power.max(axis=1)
+    d_mins = d_power.min(axis=1)
     return {
-        'dataset': os.path.basename(path).replace('_dataset.pkl', ''),
+        'dataset': dataset_key(path),
         'samples': len(data),
         'waiting_mean': waiting_times.mean(),
         'waiting_median': np.median(waiting_times),
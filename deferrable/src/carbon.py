@@ -2,41 +2,501 @@ from numpy import array
 import numpy as np
 import pandas as pd
 from pandas.core.frame import DataFrame
+from pandas.api.indexers import FixedForwardWindowIndexer
+from itertools import count
+from contextlib import contextmanager
+import tempfile
+import fcntl
+import json
+import os
+
+_trace_ids = count()
+
+CARBON_STORE = "src/traces/carbon_store"
+# index and read-only mapping of the store, opened once per process
+_carbon_store = {"index": None, "data": None}
+
+class RangeMinimumIndex():
+    """
+    First-argmin over any range of an array in O(1): a sparse table over the
+    minima of fixed-size blocks, plus direct scans of the two partial end blocks.
+    Ties resolve to the earliest position, like pandas idxmin.
+    """
+    BLOCK = 64
+
+    def __init__(self, values: np.ndarray) -> None:
+        self.values = values
+        block = self.BLOCK
+        num_blocks = -(-len(values) // block)
+        padded = np.full(num_blocks * block, np.inf)
+        padded[:len(values)] = values
+        self.padded = padded
+        level = padded.reshape(num_blocks, block).argmin(axis=1) + np.arange(num_blocks) * block
+        self.table = [level]
+        width = 1
+        while 2 * width <= num_blocks:
+            left, right = level[:-width], level[width:]
+            level = np.where(padded[right] < padded[left], right, left)
+            self.table.append(level)
+            width *= 2
+
+    def earliest_of(self, i: np.ndarray, j: np.ndarray) -> np.ndarray:
+        return np.where(self.padded[j] < self.padded[i], j, i)
+
+    def scan_blocks(self, blocks: np.ndarray, starts: np.ndarray, stops: np.ndarray) -> np.ndarray:
+        """First minimum of each block restricted to [starts, stops)"""
+        positions = blocks[:, None] * self.BLOCK + np.arange(self.BLOCK)
+        inside = (positions >= starts[:, None]) & (positions < stops[:, None])
+        return blocks * self.BLOCK + np.argmin(np.where(inside, self.padded[positions], np.inf), axis=1)
+
+    def argmins(self, starts: np.ndarray, stops: np.ndarray) -> np.ndarray:
+        """Vectorized argmin over the ranges [starts[i], stops[i])"""
+        starts = np.asarray(starts, dtype=np.int64)
+        stops = np.asarray(stops, dtype=np.int64)
+        first, last = starts // self.BLOCK, (stops - 1) // self.BLOCK
+        best = self.scan_blocks(first, starts, stops)
+        spans = np.flatnonzero(last - first > 1)
+        if len(spans):
+            lo, hi = first[spans] + 1, last[spans] - 1
+            levels = np.floor(np.log2(hi - lo + 1)).astype(np.int64)
+            middle = np.empty(len(spans), dtype=np.int64)
+            for k in np.unique(levels):
+                rows = np.flatnonzero(levels == k)
+                level = self.table[k]
+                middle[rows] = self.earliest_of(level[lo[rows]], level[hi[rows] - (1 << int(k)) + 1])
+            best[spans] = self.earliest_of(best[spans], middle)
+        return self.earliest_of(best, self.scan_blocks(last, starts, stops))
+
+    def earliest(self, i: int, j: int) -> int:
+        return j if self.padded[j] < self.padded[i] else i
+
+    def argmin(self, start: int, stop: int) -> int:
+        """Position of the first minimum of values[start:stop]"""
+        block = self.BLOCK
+        first, last = start // block, (stop - 1) // block
+        if first == last:
+            return start + int(np.argmin(self.values[start:stop]))
+        best = start + int(np.argmin(self.values[start:(first + 1) * block]))
+        if last - first > 1:
+            lo, hi = first + 1, last - 1
+            k = (hi - lo + 1).bit_length() - 1
+            level = self.table[k]
+            best = self.earliest(best, self.earliest(int(level[lo]), int(level[hi - (1 << k) + 1])))
+        tail = last * block + int(np.argmin(self.values[last * block:stop]))
+        return self.earliest(best, tail)
+
+class RollingQuantile():
+    """
+    np.quantile(values[t:t + window], q) for every position t, computed lazily in
+    blocks of window positions from pandas' rolling order statistics. The two
+    order statistics are interpolated the way numpy's linear method does, so the
+    results match np.quantile exactly (for traces without NaNs).
+    """
+
+    def __init__(self, values: np.ndarray, window: int, q: float) -> None:
+        self.values = values
+        self.window = window
+        self.q = q
+        self.quantiles = np.empty(len(values))
+        self.computed = np.zeros(-(-len(values) // window), dtype=bool)
+
+    def compute_block(self, block: int):
+        n = len(self.values)
+        start = block * self.window
+        stop = min(start + self.window, n)
+        series = pd.Series(self.values[start:stop + self.window - 1])
+        rolling = series.rolling(FixedForwardWindowIndexer(window_size=self.window), min_periods=1)
+        lower = rolling.quantile(self.q, interpolation="lower").to_numpy()[:stop - start]
+        higher = rolling.quantile(self.q, interpolation="higher").to_numpy()[:stop - start]
+        counts = np.minimum(self.window, n - np.arange(start, stop))
+        virtual = (counts - 1) * self.q
+        gamma = virtual - np.floor(virtual)
+        diff = higher - lower
+        self.quantiles[start:stop] = np.where(gamma >= 0.5, higher - diff * (1 - gamma), lower + diff * gamma)
+        self.computed[block] = True
+
+    def __getitem__(self, index: int) -> float:
+        if not 0 <= index < len(self.values):
+            raise IndexError(f"quantile window at {index} outside trace of length {len(self.values)}")
+        block = index // self.window
+        if not self.computed[block]:
+            self.compute_block(block)
+        return float(self.quantiles[index])
 
 class CarbonModel():
-    def __init__(self, name, df: DataFrame, carbon_start_index, carbon_error) -> None:
+    def __init__(self, name, values, carbon_start_index, carbon_error, root=None, offset=0) -> None:
+        """
+        Carbon intensity per slot, backed by a contiguous float64 array.
+        Subtraces are views into the root model's array (root, offset), so
+        they share its data and any index built on it.
+        """
         self.name = name
-        self.df = df
+        if isinstance(values, DataFrame):
+            values = values["carbon_intensity_avg"].to_numpy(dtype=np.float64)
+        self.values = values if root is not None else np.ascontiguousarray(values, dtype=np.float64)
         self.carbon_start_index = carbon_start_index
         self.carbon_error = carbon_error
-        self.mean = self.df["carbon_intensity_avg"].mean()
-        self.std = self.df["carbon_intensity_avg"].std()
+        self.root = root if root is not None else self
+        self.offset = offset
+        # identifies the underlying trace data; shared by all subtraces of a root
+        self.trace_id = root.trace_id if root is not None else next(_trace_ids)
+        self.length = len(self.values)
+        self.prefix = None
+        self.range_minimum = None
+        self.rolling_quantiles = {}
+
+    @property
+    def df(self) -> DataFrame:
+        """DataFrame view of the trace, for callers that still expect one"""
+        return pd.DataFrame({"carbon_intensity_avg": self.values})
+
+    @property
+    def prefix_sums(self) -> np.ndarray:
+        """Cumulative sums of the root trace, prefix_sums[i] = sum(values[:i]), built once"""
+        root = self.root
+        if root.prefix is None:
+            root.prefix = np.concatenate(([0.0], np.cumsum(root.values)))
+        return root.prefix
+
+    def cumulative(self, index):
+        """Sum of the root trace before slot index (scalar or array), on the root model"""
+        return self.prefix_sums[index]
+
+    def first_min(self, start: int, end: int) -> int:
+        """Root position of the first minimum of the root slots [start, end)"""
+        if self.range_minimum is None:
+            self.range_minimum = RangeMinimumIndex(self.values)
+        return self.range_minimum.argmin(start, end)
+
+    def first_mins(self, starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+        """Vectorized first_min"""
+        if self.range_minimum is None:
+            self.range_minimum = RangeMinimumIndex(self.values)
+        return self.range_minimum.argmins(starts, ends)
+
+    def interval_sum(self, start: int, length: int) -> float:
+        """Sum of the slots [start, start + length), wrapping around the end of this trace"""
+        n = len(self)
+        cumulative = self.root.cumulative
+        base = self.offset
+        cycles, length = divmod(length, n)
+        start %= n
+        total = cycles * (cumulative(base + n) - cumulative(base)) if cycles else 0.0
+        end = start + length
+        if end <= n:
+            return total + (cumulative(base + end) - cumulative(base + start))
+        return total + (cumulative(base + n) - cumulative(base + start)) + (cumulative(base + end - n) - cumulative(base))
+
+    def argmin(self, start_index, end_index) -> int:
+        """Position of the first lowest-carbon slot in [start_index, end_index) of this trace"""
+        start, end, _ = slice(start_index, end_index).indices(len(self))
+        if end <= start:
+            raise ValueError("argmin of an empty carbon window")
+        return self.root.first_min(self.offset + start, self.offset + end) - self.offset
+
+    def argmins(self, starts, ends) -> np.ndarray:
+        """Vectorized argmin over [starts[i], ends[i]), clamped to the trace (ranges must not be empty)"""
+        starts = np.asarray(starts, dtype=np.int64)
+        ends = np.minimum(np.asarray(ends, dtype=np.int64), len(self))
+        if np.any(ends <= starts):
+            raise ValueError("argmin of an empty carbon window")
+        return self.root.first_mins(self.offset + starts, self.offset + ends) - self.offset
+
+    def window(self, start_index, end_index) -> np.ndarray:
+        """Carbon values of the slots [start_index, end_index)"""
+        return self.values[start_index:end_index]
+
+    def rolling_quantile(self, window: int, q: float) -> RollingQuantile:
+        """Quantile q of the window carbon values starting at each tick (built once per model)"""
+        key = (window, q)
+        if key not in self.rolling_quantiles:
+            self.rolling_quantiles[key] = RollingQuantile(self.values, window, q)
+        return self.rolling_quantiles[key]
+
+    def window_sums(self, starts, lengths) -> np.ndarray:
+        """Vectorized interval_sum over arrays of starts and lengths (broadcast together)"""
+        n = len(self)
+        cumulative = self.root.cumulative
+        base = self.offset
+        cycles, lengths = np.divmod(lengths, n)
+        starts = np.asarray(starts) % n
+        ends = starts + lengths
+        total = cycles * (cumulative(base + n) - cumulative(base))
+        direct = cumulative(base + np.minimum(ends, n)) - cumulative(base + starts)
+        wrapped = np.where(ends > n, cumulative(base + np.maximum(ends - n, 0)) - cumulative(base), 0.0)
+        return total + direct + wrapped
+
+    @property
+    def mean(self):
+        return self.values.mean()
+
+    @property
+    def std(self):
+        return self.values.std(ddof=1)
 
     def reindex(self, index):
-        df = self.df[index:].copy().reset_index()
-        model = CarbonModel(self.name, df, self.carbon_start_index, self.carbon_error)
-        return model
+        return self.subtrace(index, None)
 
     def subtrace(self, start_index, end_index):
-        df = self.df[start_index: end_index].copy().reset_index()
-        model = CarbonModel(self.name, df,self.carbon_start_index, self.carbon_error)
-        return model
-    
+        start, end, _ = slice(start_index, end_index).indices(len(self))
+        end = max(start, end)
+        return CarbonModel(self.name, self.values[start:end], self.carbon_start_index,
+                           self.carbon_error, self.root, self.offset + start)
+
     def extend(self, factor):
-        df = pd.DataFrame(np.repeat(self.df.values, factor, axis=0), columns=["carbon_intensity_avg"])
-        df["carbon_intensity_avg"] /= factor
-        model = CarbonModel(self.name, df,self.carbon_start_index, self.carbon_error)
-        return model
+        """Trace with every slot split into factor slots of 1/factor of its carbon"""
+        if float(factor).is_integer():
+            return UpsampledCarbonModel(self, int(factor))
+        values = np.repeat(self.values, factor, axis=0) / factor
+        return CarbonModel(self.name, values, self.carbon_start_index, self.carbon_error)
+
+    def __len__(self):
+        return self.length
 
     def __getitem__(self, index):
-        return self.df.iloc[index]['carbon_intensity_avg']
+        return self.values[index]
+
+class UpsampledCarbonModel(CarbonModel):
+    """
+    A trace upsampled by an integer factor without materializing it: slot t holds
+    the value of base slot t // factor divided by factor. Sums, minima and
+    quantiles are computed from the base slots; arrays at the upsampled
+    resolution are only built by window() and values.
+    """
+
+    def __init__(self, base: CarbonModel, factor: int, root=None, offset=0, length=None) -> None:
+        self.name = base.name
+        self.carbon_start_index = base.carbon_start_index
+        self.carbon_error = base.carbon_error
+        self.factor = factor
+        self.root = root if root is not None else self
+        self.offset = offset
+        self.trace_id = root.trace_id if root is not None else next(_trace_ids)
+        if root is None:
+            # the value of every upsampled slot within each base slot
+            self.slot_values = np.ascontiguousarray(base.values / factor, dtype=np.float64)
+            self.length = len(self.slot_values) * factor
+            self.slot_prefix = np.concatenate(([0.0], np.cumsum(self.slot_values * factor)))
+            self.padded_values = np.append(self.slot_values, 0.0)
+        else:
+            self.length = length
+        self.base = base
+        self.prefix = None
+        self.range_minimum = None
+        self.rolling_quantiles = {}
+
+    @property
+    def values(self) -> np.ndarray:
+        """The whole trace at the upsampled resolution (materialized on every access, only for callers that ask for it)"""
+        return self.window(0, len(self))
+
+    def slot_counts(self):
+        """Base slots under this view and how many of its ticks fall in each"""
+        start, end = self.offset, self.offset + len(self)
+        first, last = start // self.factor, (end - 1) // self.factor
+        counts = np.full(last - first + 1, self.factor, dtype=np.int64)
+        counts[0] -= start - first * self.factor
+        counts[-1] -= (last + 1) * self.factor - end
+        return self.root.slot_values[first:last + 1], counts
+
+    @property
+    def mean(self):
+        if len(self) == 0:
+            return np.nan
+        values, counts = self.slot_counts()
+        return np.dot(values, counts) / len(self)
+
+    @property
+    def std(self):
+        if len(self) < 2:
+            return np.nan
+        values, counts = self.slot_counts()
+        mean = np.dot(values, counts) / len(self)
+        return np.sqrt(np.dot((values - mean) ** 2, counts) / (len(self) - 1))
+
+    def cumulative(self, index):
+        slots, within = np.divmod(index, self.factor)
+        return self.slot_prefix[slots] + within * self.padded_values[slots]
+
+    def first_min(self, start: int, end: int) -> int:
+        # all the slots within a base slot are equal, so the first minimum is the
+        # first slot of the minimal base slot that falls inside [start, end)
+        if self.range_minimum is None:
+            self.range_minimum = RangeMinimumIndex(self.slot_values)
+        lowest = self.range_minimum.argmin(start // self.factor, (end - 1) // self.factor + 1)
+        return max(start, lowest * self.factor)
+
+    def first_mins(self, starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+        if self.range_minimum is None:
+            self.range_minimum = RangeMinimumIndex(self.slot_values)
+        lowest = self.range_minimum.argmins(starts // self.factor, (ends - 1) // self.factor + 1)
+        return np.maximum(starts, lowest * self.factor)
+
+    def window(self, start_index, end_index) -> np.ndarray:
+        start, end, _ = slice(start_index, end_index).indices(len(self))
+        if end <= start:
+            return np.empty(0)
+        start += self.offset
+        end += self.offset
+        root = self.root
+        first, last = start // root.factor, (end - 1) // root.factor
+        values = np.repeat(root.slot_values[first:last + 1], root.factor)
+        return values[start - first * root.factor:end - first * root.factor]
+
+    def rolling_quantile(self, window: int, q: float):
+        key = (window, q)
+        if key not in self.rolling_quantiles:
+            self.rolling_quantiles[key] = UpsampledRollingQuantile(self, window, q)
+        return self.rolling_quantiles[key]
+
+    def subtrace(self, start_index, end_index):
+        start, end, _ = slice(start_index, end_index).indices(len(self))
+        end = max(start, end)
+        return UpsampledCarbonModel(self.base, self.factor, self.root, self.offset + start, end - start)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step == 1:
+                return self.window(start, stop)
+            positions = np.arange(start, stop, step)
+            return self.root.slot_values[(self.offset + positions) // self.factor]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("carbon slot out of range")
+        return self.root.slot_values[(self.offset + index) // self.factor]
+
+class UpsampledRollingQuantile():
+    """
+    RollingQuantile of an UpsampledCarbonModel: a window covers few base slots,
+    each repeated, so its order statistics come from the sorted base slots and
+    their counts. Interpolated like np.quantile's linear method.
+    """
+
+    def __init__(self, model: UpsampledCarbonModel, window: int, q: float) -> None:
+        self.model = model
+        self.window = window
+        self.q = q
+        self.quantiles = {}
+
+    def compute(self, index: int) -> float:
+        model = self.model
+        root = model.root
+        start = model.offset + index
+        end = model.offset + min(index + self.window, len(model))
+        first, last = start // root.factor, (end - 1) // root.factor
+        slots = np.arange(first, last + 1)
+        counts = np.minimum(end, (slots + 1) * root.factor) - np.maximum(start, slots * root.factor)
+        values = root.slot_values[first:last + 1]
+        order = np.argsort(values, kind="stable")
+        values, ranks = values[order], np.cumsum(counts[order])
+        n = end - start
+        virtual = (n - 1) * self.q
+        if virtual >= n - 1:
+            return float(values[-1])
+        previous = np.floor(virtual)
+        lower = values[np.searchsorted(ranks, previous, side="right")]
+        higher = values[np.searchsorted(ranks, previous + 1, side="right")]
+        gamma = virtual - previous
+        diff = higher - lower
+        return float(higher - diff * (1 - gamma) if gamma >= 0.5 else lower + diff * gamma)
+
+    def __getitem__(self, index: int) -> float:
+        if not 0 <= index < len(self.model):
+            raise IndexError(f"quantile window at {index} outside trace of length {len(self.model)}")
+        if index not in self.quantiles:
+            self.quantiles[index] = self.compute(index)
+        return self.quantiles[index]
+
+@contextmanager
+def carbon_store_lock(exclusive: bool):
+    """Lock the store against concurrent writers (exclusive) or while reading its index and data (shared)"""
+    os.makedirs(os.path.dirname(CARBON_STORE), exist_ok=True)
+    with open(f"{CARBON_STORE}.lock", "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+def read_carbon_store():
+    try:
+        with open(f"{CARBON_STORE}.json") as f:
+            index = json.load(f)
+        data = np.memmap(f"{CARBON_STORE}.bin", dtype=np.float64, mode="r") if index else None
+    except (OSError, ValueError):
+        index, data = {}, None
+    _carbon_store["index"] = index
+    _carbon_store["data"] = data
+
+def open_carbon_store():
+    """(Re)load the store index and map its data read-only"""
+    with carbon_store_lock(exclusive=False):
+        read_carbon_store()
+
+def replace_store_file(suffix: str, write):
+    """Write a store file through a private temporary file and move it into place"""
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(CARBON_STORE), prefix=os.path.basename(CARBON_STORE) + ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w" if suffix == ".json" else "wb") as f:
+            write(f)
+        os.replace(tmp, f"{CARBON_STORE}{suffix}")
+    except BaseException:
+        os.remove(tmp)
+        raise
+
+def add_to_carbon_store(carbon_trace: str, signature: list):
+    """
+    Store the carbon intensities of a regional csv. The data is rewritten with
+    every other region followed by this one, so a replaced region leaves nothing
+    behind. Writers hold the store lock exclusively; readers map the index and
+    data under a shared lock, and keep their mapping of the old data file.
+    """
+    with carbon_store_lock(exclusive=True):
+        read_carbon_store()
+        index = _carbon_store["index"]
+        if index.get(carbon_trace, {}).get("source") == signature:
+            # converted by another process meanwhile
+            return
+        values = pd.read_csv(f"src/traces/{carbon_trace}.csv")["carbon_intensity_avg"].to_numpy(dtype=np.float64)
+        data = _carbon_store["data"]
+        kept = {name: entry for name, entry in index.items() if name != carbon_trace}
+        new_index = {}
+
+        def write_data(f):
+            offset = 0
+            for name, entry in kept.items():
+                f.write(data[entry["offset"]:entry["offset"] + entry["length"]].tobytes())
+                new_index[name] = dict(entry, offset=offset)
+                offset += entry["length"]
+            f.write(values.tobytes())
+            new_index[carbon_trace] = {"offset": offset, "length": len(values), "source": signature}
+
+        replace_store_file(".bin", write_data)
+        replace_store_file(".json", lambda f: json.dump(new_index, f))
+        read_carbon_store()
+
+def load_carbon_trace(carbon_trace: str) -> np.ndarray:
+    """Raw hourly intensities of a region, converted into the store on first use"""
+    if _carbon_store["index"] is None or carbon_trace not in _carbon_store["index"]:
+        open_carbon_store()
+    entry = _carbon_store["index"].get(carbon_trace)
+    source = f"src/traces/{carbon_trace}.csv"
+    if os.path.exists(source):
+        stat = os.stat(source)
+        signature = [stat.st_size, stat.st_mtime_ns]
+        if entry is None or entry["source"] != signature:
+            add_to_carbon_store(carbon_trace, signature)
+            entry = _carbon_store["index"][carbon_trace]
+    elif entry is None:
+        raise FileNotFoundError(source)
+    return _carbon_store["data"][entry["offset"]:entry["offset"] + entry["length"]]
 
 def get_carbon_model(carbon_trace:str, carbon_start_index:int, carbon_error="ORACLE") -> CarbonModel:
-    df = pd.read_csv(f"src/traces/{carbon_trace}.csv")
-    df = df[17544+carbon_start_index:17544+carbon_start_index+720]
-    df = df[["carbon_intensity_avg"]]
-    df["carbon_intensity_avg"] /= 1000
-    c = CarbonModel(carbon_trace, df, carbon_start_index, carbon_error)
+    trace = load_carbon_trace(carbon_trace)
+    start, stop, _ = slice(17544+carbon_start_index, 17544+carbon_start_index+720).indices(len(trace))
+    c = CarbonModel(carbon_trace, trace[start:stop] / 1000, carbon_start_index, carbon_error)
     return c
 
 def get_carbon_model_from_array(arr, carbon_error="CUSTOM"):
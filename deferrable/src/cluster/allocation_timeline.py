@@ -0,0 +1,68 @@
+import numpy as np
+
+
+class AllocationTimeline:
+    def __init__(self, length: int) -> None:
+        """CPU allocation per tick, stored as a difference array.
+
+        Range adds are O(1). Reading a slice materializes the prefix sum once
+        (cached until the next add); point queries walk a cursor forward, so
+        the monotone reads done while simulating stay cheap.
+        """
+        self.length = length
+        self.diff = np.zeros(length + 1, dtype=np.int64)
+        self.values = None
+        self.cursor = -1
+        self.cursor_value = 0
+
+    def add(self, start: int, stop: int, cpus: int):
+        """Allocate cpus over the ticks [start, stop)"""
+        if start < 0 or stop > self.length:
+            raise IndexError(f"allocation [{start}, {stop}) outside timeline of length {self.length}")
+        if start >= stop:
+            return
+        self.diff[start] += cpus
+        self.diff[stop] -= cpus
+        self.values = None
+        if start <= self.cursor < stop:
+            self.cursor_value += cpus
+
+    def add_many(self, starts: np.ndarray, stops: np.ndarray, cpus: np.ndarray):
+        """Allocate cpus[i] over the ticks [starts[i], stops[i]) for every i"""
+        keep = starts < stops
+        starts, stops, cpus = starts[keep], stops[keep], cpus[keep]
+        if len(starts) == 0:
+            return
+        if starts.min() < 0 or stops.max() > self.length:
+            raise IndexError(f"allocations outside timeline of length {self.length}")
+        np.add.at(self.diff, starts, cpus)
+        np.add.at(self.diff, stops, -cpus)
+        self.values = None
+        self.cursor_value += int(cpus[(starts <= self.cursor) & (self.cursor < stops)].sum())
+
+    def to_array(self) -> np.ndarray:
+        """Allocation of every tick"""
+        if self.values is None:
+            self.values = np.cumsum(self.diff[:-1])
+        return self.values
+
+    def __len__(self):
+        return self.length
+
+    def __iter__(self):
+        return iter(self.to_array().tolist())
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self.to_array()[index]
+        if index < 0:
+            index += self.length
+        if not 0 <= index < self.length:
+            raise IndexError("allocation index out of range")
+        if self.values is not None:
+            return int(self.values[index])
+        if index >= self.cursor:
+            self.cursor_value += int(self.diff[self.cursor + 1 : index + 1].sum())
+            self.cursor = index
+            return self.cursor_value
+        return int(self.diff[: index + 1].sum())
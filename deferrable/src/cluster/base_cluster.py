@@ -1,9 +1,13 @@
 from abc import ABC, abstractmethod
+from typing import List
 import os
+import numpy as np
 import pandas as pd
 from carbon import CarbonModel
-from task import Task, TIME_FACTOR
+from task import Task, Segment, TIME_FACTOR
 from threading import Lock
+from .allocation_timeline import AllocationTimeline
+from .task_records import TaskRecords
 
 ON_DEMAND_COST_HOUR = 0.0624
 SPOT_COST_HOUR = 0.01248
@@ -26,22 +30,32 @@ class BaseCluster(ABC):
         self.total_reserved_instances = reserved_instances
         self.available_reserved_instances = reserved_instances
         self.carbon_model = carbon_model
-        self.details = []
+        self.details = TaskRecords()
         self.experiment_name = experiment_name
-        self.runtime_allocation = [0] * carbon_model.df.shape[0]
+        self.runtime_allocation = AllocationTimeline(len(carbon_model))
         self.lock = Lock()
         self.allow_spot = allow_spot
 
     @abstractmethod
-    def submit(self, current_time, task: Task):
+    def submit(self, current_time, task: Task, schedule=None):
         """Submit Tasks to the Cluster Queue"""
         pass
 
+    def submit_segments(self, current_time, segments: List[Segment]):
+        """Submit suspend-resume segments that start now"""
+        for segment in segments:
+            self.submit(current_time, segment)
+
     @abstractmethod
     def refresh_data(self, current_time):
         """Release Allocated Resources, Only used in simulation"""
         pass
 
+    @abstractmethod
+    def next_event_time(self, current_time):
+        """Next tick at which allocated resources are released, Only used in simulation"""
+        pass
+
     def log_task(self, start_time, task: Task, dollar_cost, carbon, reason="completed"):
         if task.scheduled_wait is not None:
             waiting_time = task.scheduled_wait
@@ -49,8 +63,7 @@ class BaseCluster(ABC):
             waiting_time = start_time - task.arrival_time
         exit_time = start_time + task.task_length
         self.max_time = max(self.max_time, start_time)
-        for i in range(start_time, exit_time + 1):
-            self.runtime_allocation[i] += task.CPUs
+        self.runtime_allocation.add(start_time, exit_time + 1, task.CPUs)
         self.details.append([
             task.ID,
             task.arrival_time,
@@ -66,6 +79,27 @@ class BaseCluster(ABC):
             reason,
         ])
 
+    def log_tasks(self, start_time, segments: List[Segment], dollar_costs, carbons, reason="completed"):
+        """log_task for segments that all start at start_time"""
+        lengths = np.array([segment.task_length for segment in segments], dtype=np.int64)
+        cpus = np.array([segment.CPUs for segment in segments], dtype=np.int64)
+        self.max_time = max(self.max_time, start_time)
+        self.runtime_allocation.add_many(np.full(len(segments), start_time), start_time + lengths + 1, cpus)
+        self.details.extend(
+            ID=[segment.ID for segment in segments],
+            arrival_time=[segment.arrival_time for segment in segments],
+            length=lengths,
+            cpus=cpus,
+            length_class=[segment.task_length_class for segment in segments],
+            resource_class=[segment.CPUs_class for segment in segments],
+            carbon_cost=carbons,
+            dollar_cost=dollar_costs,
+            start_time=start_time,
+            waiting_time=[segment.scheduled_wait for segment in segments],
+            exit_time=start_time + lengths,
+            reason=reason,
+        )
+
     @abstractmethod
     def save_results(
         self,
@@ -75,39 +109,35 @@ class BaseCluster(ABC):
         carbon_trace: str,
         task_trace: str,
         waiting_times_str: str,
+        export_csv: bool = False,
     ):
-        """Save Simulation Results"""
-        self.total_dollar_cost += (
+        """
+        Save Simulation Results: per-task details and the hourly mean CPU allocation,
+        one array per column in .npz files (and as CSV with export_csv)
+        """
+        reserved_cost = (
             self.total_reserved_instances
             * self.reserved_discount_rate
             * self.max_time
             * self.on_demand_cost
         )
-        self.details.append([
-            -1, 0, 0, 0, 0, 0, 0,
-            self.total_reserved_instances
-            * self.reserved_discount_rate
-            * self.max_time
-            * self.on_demand_cost,
-            0, 0, 0, 0,
-        ])
-        df = pd.DataFrame(
-            self.details,
-            columns=[
-                "ID", "arrival_time", "length", "cpus", "length_class",
-                "resource_class", "carbon_cost", "dollar_cost", "start_time",
-                "waiting_time", "exit_time", "reason",
-            ],
-        )
+        self.total_dollar_cost += reserved_cost
+        self.details.append([-1, 0, 0, 0, 0, 0, 0, reserved_cost, 0, 0, 0, 0])
         os.makedirs(f"results/{cluster_type}/{task_trace}/", exist_ok=True)
-        file_name = f"results/{cluster_type}/{task_trace}/details-{scheduling_policy}-{self.carbon_model.carbon_start_index}-{carbon_policy}-{carbon_trace}-{self.total_reserved_instances}-{waiting_times_str}.csv"
-        df.to_csv(file_name, index=False)
-        runtime_df = pd.DataFrame(self.runtime_allocation, columns=["cpus"])
-        runtime_df["time"] = range(self.carbon_model.df.shape[0])
-        runtime_df["time"] //= 60
-        runtime_df = runtime_df.groupby("time").mean().reset_index()
-        file_name = f"results/{cluster_type}/{task_trace}/runtime-{scheduling_policy}-{self.carbon_model.carbon_start_index}-{carbon_policy}-{carbon_trace}-{self.total_reserved_instances}-{waiting_times_str}.csv"
-        runtime_df.to_csv(file_name, index=False)
+        suffix = f"{scheduling_policy}-{self.carbon_model.carbon_start_index}-{carbon_policy}-{carbon_trace}-{self.total_reserved_instances}-{waiting_times_str}"
+        file_name = f"results/{cluster_type}/{task_trace}/details-{suffix}"
+        self.details.save(file_name + ".npz")
+        if export_csv:
+            self.details.to_dataframe().to_csv(file_name + ".csv", index=False)
+
+        # mean allocation per 60-tick (5 minute) bucket (the last bucket may be partial)
+        runtime = self.runtime_allocation.to_array()
+        buckets = np.arange(0, len(runtime), 60)
+        cpus = np.add.reduceat(runtime, buckets) / np.diff(np.append(buckets, len(runtime)))
+        file_name = f"results/{cluster_type}/{task_trace}/runtime-{suffix}"
+        np.savez(file_name + ".npz", time=np.arange(len(cpus)), cpus=cpus)
+        if export_csv:
+            pd.DataFrame({"time": np.arange(len(cpus)), "cpus": cpus}).to_csv(file_name + ".csv", index=False)
 
     @abstractmethod
     def sleep(self):
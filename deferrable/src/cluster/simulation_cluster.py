@@ -1,7 +1,10 @@
-from scheduling.carbon_waiting_policy import compute_carbon_consumption
-from task import Task
+from scheduling.carbon_waiting_policy import Schedule, compute_carbon_consumption
+from typing import List
+from task import Task, Segment
 from .base_cluster import BaseCluster
 import pandas as pd
+import numpy as np
+import heapq
 import os
 
 class SimulationCluster(BaseCluster):
@@ -15,49 +18,71 @@ class SimulationCluster(BaseCluster):
             allow_spot=allow_spot,
         )
         self.release_instance = {}
+        self.release_times = []
 
-    def submit(self, current_time, task):
+    def submit(self, current_time, task, schedule: Schedule = None):
+        """Admit a task starting now; schedule is the scheduler's plan for this start, if any"""
         try:
-            c_model = self.carbon_model.subtrace(
-                current_time, current_time + max(task.task_length, task.expected_time)
-            )
-            schedule = compute_carbon_consumption(task, 0, c_model)
-            finish_time = schedule.actual_finish_time(current_time)
-            if self.allow_spot and task.task_length_class == "0-2":
-                self.total_carbon_cost += schedule.carbon_cost
-                self.total_dollar_cost += task.CPUs * task.task_length * self.spot_cost
-                self.log_task(
-                    current_time,
-                    task,
-                    task.CPUs * task.task_length * self.spot_cost,
-                    schedule.carbon_cost,
-                )
-            else:
-                if self.available_reserved_instances >= task.CPUs:
-                    if finish_time not in self.release_instance:
-                        self.release_instance[finish_time] = 0
-                    self.release_instance[finish_time] += task.CPUs
-                    on_demand = 0
-                    self.available_reserved_instances -= task.CPUs
-                else:
-                    on_demand = task.CPUs
-                self.total_carbon_cost += schedule.carbon_cost
-                self.total_dollar_cost += (
-                    on_demand * task.task_length * self.on_demand_cost
-                )
-                self.log_task(
-                    current_time,
-                    task,
-                    on_demand * task.task_length * self.on_demand_cost,
-                    schedule.carbon_cost,
+            if schedule is None:
+                c_model = self.carbon_model.subtrace(
+                    current_time, current_time + max(task.task_length, task.expected_time)
                 )
+                schedule = compute_carbon_consumption(task, 0, c_model)
+            dollar_cost = self.admit(current_time, task, schedule.carbon_cost)
+            self.log_task(current_time, task, dollar_cost, schedule.carbon_cost)
         except Exception as e:
             print(f"RealClusterCost: execute error {e}")
             raise
 
+    def submit_segments(self, current_time, segments: List[Segment]):
+        """Admit suspend-resume segments starting now, costed and logged in one pass"""
+        try:
+            lengths = np.array([segment.task_length for segment in segments], dtype=np.int64)
+            cpus = np.array([segment.CPUs for segment in segments], dtype=np.int64)
+            carbons = (self.carbon_model.window_sums(current_time, lengths) * cpus).tolist()
+            for i, segment in enumerate(segments):
+                # past the end of the trace a segment's window wraps within its own span
+                if current_time + max(segment.task_length, segment.expected_time) > len(self.carbon_model):
+                    c_model = self.carbon_model.subtrace(
+                        current_time, current_time + max(segment.task_length, segment.expected_time)
+                    )
+                    carbons[i] = compute_carbon_consumption(segment, 0, c_model).carbon_cost
+            dollar_costs = [
+                self.admit(current_time, segment, carbon) for segment, carbon in zip(segments, carbons)
+            ]
+            self.log_tasks(current_time, segments, dollar_costs, carbons)
+        except Exception as e:
+            print(f"RealClusterCost: execute error {e}")
+            raise
+
+    def admit(self, current_time, task, carbon_cost) -> float:
+        """Place a task on spot, reserved or on-demand instances and account its costs"""
+        if self.allow_spot and task.task_length_class == "0-2":
+            dollar_cost = task.CPUs * task.task_length * self.spot_cost
+        else:
+            finish_time = current_time + task.task_length
+            if self.available_reserved_instances >= task.CPUs:
+                if finish_time not in self.release_instance:
+                    self.release_instance[finish_time] = 0
+                    heapq.heappush(self.release_times, finish_time)
+                self.release_instance[finish_time] += task.CPUs
+                on_demand = 0
+                self.available_reserved_instances -= task.CPUs
+            else:
+                on_demand = task.CPUs
+            dollar_cost = on_demand * task.task_length * self.on_demand_cost
+        self.total_carbon_cost += carbon_cost
+        self.total_dollar_cost += dollar_cost
+        return dollar_cost
+
     def refresh_data(self, current_time):
         self.release_reserved(current_time)
 
+    def next_event_time(self, current_time):
+        while self.release_times and self.release_times[0] <= current_time:
+            heapq.heappop(self.release_times)
+        return self.release_times[0] if self.release_times else None
+
     def release_reserved(self, current_time):
         if current_time in self.release_instance:
             self.available_reserved_instances += self.release_instance[current_time]
@@ -81,6 +106,7 @@ class SimulationCluster(BaseCluster):
         carbon_trace,
         task_trace,
         waiting_times_str,
+        export_csv=False,
     ):
         super().save_results(
             cluster_type,
@@ -89,4 +115,5 @@ class SimulationCluster(BaseCluster):
             carbon_trace,
             task_trace,
             waiting_times_str,
+            export_csv,
         )
\ No newline at end of file
@@ -0,0 +1,109 @@
+import numpy as np
+import pandas as pd
+
+
+class TaskRecords:
+    """Per-task records of a cluster, stored as a growable structured array.
+
+    Capacity doubles when full, so appending stays amortized O(1). Class
+    labels and reasons are stored as codes into per-column label lists. Rows
+    read back as lists in COLUMNS order, like the lists details used to hold.
+    """
+
+    COLUMNS = [
+        "ID", "arrival_time", "length", "cpus", "length_class",
+        "resource_class", "carbon_cost", "dollar_cost", "start_time",
+        "waiting_time", "exit_time", "reason",
+    ]
+    DTYPE = np.dtype([
+        ("ID", np.int64), ("arrival_time", np.int64), ("length", np.int64), ("cpus", np.int64),
+        ("length_class", np.int16), ("resource_class", np.int16),
+        ("carbon_cost", np.float64), ("dollar_cost", np.float64),
+        ("start_time", np.int64), ("waiting_time", np.int64), ("exit_time", np.int64),
+        ("reason", np.int16),
+    ])
+    CATEGORICAL = ("length_class", "resource_class", "reason")
+
+    def __init__(self, capacity: int = 1024) -> None:
+        self.records = np.empty(capacity, dtype=self.DTYPE)
+        self.size = 0
+        self.labels = {name: [] for name in self.CATEGORICAL}
+        self.codes = {name: {} for name in self.CATEGORICAL}
+
+    def code(self, name: str, label) -> int:
+        """Code of label in the categorical column name, added on first use"""
+        codes = self.codes[name]
+        if label not in codes:
+            codes[label] = len(self.labels[name])
+            self.labels[name].append(label)
+        return codes[label]
+
+    def reserve(self, count: int):
+        """Make room for count more records"""
+        needed = self.size + count
+        if needed > len(self.records):
+            records = np.empty(max(needed, 2 * len(self.records)), dtype=self.DTYPE)
+            records[:self.size] = self.records[:self.size]
+            self.records = records
+
+    def append(self, row: list):
+        """Add one record, given as a list in COLUMNS order"""
+        self.reserve(1)
+        self.records[self.size] = tuple(
+            self.code(name, value) if name in self.codes else value
+            for name, value in zip(self.COLUMNS, row)
+        )
+        self.size += 1
+
+    def extend(self, **columns):
+        """Add one record per element of the column arrays; scalars apply to every record"""
+        count = max(np.size(value) for value in columns.values())
+        self.reserve(count)
+        block = self.records[self.size:self.size + count]
+        for name in self.COLUMNS:
+            value = columns[name]
+            if name in self.codes:
+                value = [self.code(name, label) for label in value] if isinstance(value, list) else self.code(name, value)
+            block[name] = value
+        self.size += count
+
+    def column(self, name: str) -> np.ndarray:
+        """Values of a column (codes for categorical ones), as a view"""
+        return self.records[name][:self.size]
+
+    def to_dataframe(self) -> pd.DataFrame:
+        """The records as a DataFrame with COLUMNS, labels decoded"""
+        data = {}
+        for name in self.COLUMNS:
+            if name in self.codes:
+                data[name] = np.array(self.labels[name], dtype=object)[self.column(name)]
+            else:
+                data[name] = self.column(name)
+        return pd.DataFrame(data, columns=self.COLUMNS)
+
+    def save(self, path: str):
+        """Write every column as an array of an .npz file, categorical ones with their labels"""
+        arrays = {name: self.column(name) for name in self.COLUMNS}
+        for name in self.CATEGORICAL:
+            arrays[f"{name}_labels"] = np.array(["" if label is None else str(label) for label in self.labels[name]])
+        np.savez(path, **arrays)
+
+    def tolist(self) -> list:
+        return [self[i] for i in range(self.size)]
+
+    def __len__(self):
+        return self.size
+
+    def __iter__(self):
+        return (self[i] for i in range(self.size))
+
+    def __getitem__(self, index: int) -> list:
+        if index < 0:
+            index += self.size
+        if not 0 <= index < self.size:
+            raise IndexError("record index out of range")
+        record = self.records[index]
+        return [
+            self.labels[name][record[name]] if name in self.codes else record[name].item()
+            for name in self.COLUMNS
+        ]
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+Columnar on-disk format for dgp datasets.
+
+A dataset is a directory {key}_dataset.cols holding
+  - header.json: format name, version, sample count and the stored columns
+  - {series}.npy: one (samples, windows) float32/int32 array per time series
+  - scalars.npy: one structured row of scalar fields per sample
+Every array is a plain .npy file, so it can be memory-mapped and sliced
+without reading the rest of the dataset.
+
+Usage: python dataset_store.py datasets/*_dataset.pkl  (converts pickles)
+"""
+import os
+import json
+import shutil
+import pickle
+from collections.abc import Sequence
+from typing import Iterable
+
+import numpy as np
+
+FORMAT_NAME = "dgp-columnar"
+FORMAT_VERSION = 1
+SUFFIX = ".cols"
+
+SERIES = {
+    "d_power": np.float32,
+    "base_usage": np.float32,
+    "pol_usage": np.float32,
+    "base_job_counts": np.int32,
+    "job_counts": np.int32,
+}
+SCALARS_DTYPE = np.dtype([
+    ("waiting_time", np.float64),
+    ("base_wait", np.float64),
+    ("pol_wait", np.float64),
+    ("carbon_start_index", np.int32),
+    ("num_tasks", np.int32),
+    ("scheduled_jobs", np.int32),
+    ("pol_scheduled_jobs", np.int32),
+    ("sched_policy", "U32"),
+    ("carbon_policy", "U32"),
+])
+
+def columnar_path(pickle_path: str) -> str:
+    """Columnar dataset path of a {key}_dataset.pkl path"""
+    base = pickle_path[:-len(".pkl")] if pickle_path.endswith(".pkl") else pickle_path
+    return base + SUFFIX
+
+def is_columnar_dataset(path: str) -> bool:
+    return os.path.isfile(os.path.join(path, "header.json"))
+
+def series_names(result: dict) -> list:
+    """Names of the time series of a dgp result, with extra resolutions as {resolution}.{series}"""
+    names = [name for name in SERIES if name in result]
+    for resolution, series in result.get("resolutions", {}).items():
+        names += [f"{resolution}.{name}" for name in SERIES if name in series]
+    return names
+
+def series_value(result: dict, name: str):
+    if "." in name:
+        resolution, name = name.split(".", 1)
+        return result["resolutions"][resolution][name]
+    return result[name]
+
+def write_columnar_dataset(results: Iterable[dict], num_samples: int, path: str):
+    """
+    Write num_samples dgp results (as produced by dgp.evaluate_policy) to a columnar
+    dataset at path. Rows are written as they come, so results can be a generator.
+    The dataset replaces any existing one at path once it is complete.
+    """
+    tmp = path + ".tmp"
+    if os.path.exists(tmp):
+        shutil.rmtree(tmp)
+    os.makedirs(tmp)
+    scalars = np.lib.format.open_memmap(os.path.join(tmp, "scalars.npy"), mode="w+",
+                                        dtype=SCALARS_DTYPE, shape=(num_samples,))
+    series = {}
+    count = 0
+    for i, result in enumerate(results):
+        if i == 0:
+            for name in series_names(result):
+                dtype = SERIES[name.rsplit(".", 1)[-1]]
+                series[name] = np.lib.format.open_memmap(os.path.join(tmp, f"{name}.npy"), mode="w+",
+                                                         dtype=dtype, shape=(num_samples, len(series_value(result, name))))
+        for name, column in series.items():
+            column[i] = series_value(result, name)
+        scalars[i] = tuple(result[name] for name in SCALARS_DTYPE.names)
+        count += 1
+    if count != num_samples:
+        raise ValueError(f"Expected {num_samples} results, got {count}")
+    for column in [scalars, *series.values()]:
+        column.flush()
+    header = {
+        "format": FORMAT_NAME,
+        "version": FORMAT_VERSION,
+        "num_samples": num_samples,
+        "series": {name: {"dtype": column.dtype.str, "windows": column.shape[1]} for name, column in series.items()},
+        "scalars": SCALARS_DTYPE.names,
+    }
+    with open(os.path.join(tmp, "header.json"), "w") as f:
+        json.dump(header, f, indent=1)
+    del scalars, series
+    if os.path.exists(path):
+        shutil.rmtree(path)
+    os.replace(tmp, path)
+
+class ColumnarDataset(Sequence):
+    """
+    Read-only, memory-mapped view of a columnar dataset. series(name) and
+    scalar(name) give whole columns; indexing gives one sample as a dict with
+    the keys of a pickled dgp result (series as arrays).
+    """
+
+    def __init__(self, path: str) -> None:
+        with open(os.path.join(path, "header.json")) as f:
+            header = json.load(f)
+        if header.get("format") != FORMAT_NAME:
+            raise ValueError(f"{path} is not a {FORMAT_NAME} dataset")
+        if header["version"] != FORMAT_VERSION:
+            raise ValueError(f"{path} has format version {header['version']}, expected {FORMAT_VERSION}")
+        self.path = path
+        self.header = header
+        self.num_samples = header["num_samples"]
+        self.series_names = list(header["series"])
+        self.columns = {}
+
+    def load(self, name: str) -> np.ndarray:
+        if name not in self.columns:
+            self.columns[name] = np.load(os.path.join(self.path, f"{name}.npy"), mmap_mode="r")
+        return self.columns[name]
+
+    def series(self, name: str) -> np.ndarray:
+        """(samples, windows) array of a time series"""
+        if name not in self.series_names:
+            raise KeyError(f"{self.path} has no series {name}")
+        return self.load(name)
+
+    @property
+    def scalars(self) -> np.ndarray:
+        return self.load("scalars")
+
+    def scalar(self, name: str) -> np.ndarray:
+        return self.scalars[name]
+
+    def __len__(self):
+        return self.num_samples
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("sample index out of range")
+        row = self.scalars[index]
+        result = {name: row[name].item() for name in SCALARS_DTYPE.names}
+        for name in self.series_names:
+            column = self.series(name)[index]
+            if "." in name:
+                resolution, name = name.split(".", 1)
+                result.setdefault("resolutions", {}).setdefault(resolution, {})[name] = column
+            else:
+                result[name] = column
+        return result
+
+def open_columnar_dataset(path: str) -> ColumnarDataset:
+    return ColumnarDataset(path)
+
+class PickledDataset(Sequence):
+    """
+    The samples of a pickled dataset with the column access of ColumnarDataset;
+    a column is stacked from the samples the first time it is asked for.
+    """
+
+    def __init__(self, results: list) -> None:
+        self.results = results
+        self.columns = {}
+        self.series_names = series_names(results[0]) if results else []
+
+    def series(self, name: str) -> np.ndarray:
+        """(samples, windows) array of a time series"""
+        if name not in self.columns:
+            if name not in self.series_names:
+                raise KeyError(f"dataset has no series {name}")
+            self.columns[name] = np.array([series_value(result, name) for result in self.results])
+        return self.columns[name]
+
+    def scalar(self, name: str) -> np.ndarray:
+        if name not in self.columns:
+            self.columns[name] = np.array([result[name] for result in self.results])
+        return self.columns[name]
+
+    def __len__(self):
+        return len(self.results)
+
+    def __getitem__(self, index):
+        return self.results[index]
+
+def convert_pickle_dataset(pickle_path: str, path: str = None) -> str:
+    """Write the columnar copy of a pickled dataset (next to it by default); returns its path"""
+    path = path or columnar_path(pickle_path)
+    with open(pickle_path, "rb") as f:
+        results = pickle.load(f)
+    write_columnar_dataset(results, len(results), path)
+    return path
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser("Convert pickled dgp datasets to the columnar format")
+    parser.add_argument("datasets", nargs="+", help="*_dataset.pkl files")
+    args = parser.parse_args()
+    for pickle_path in args.datasets:
+        print(f"Converted {pickle_path} -> {convert_pickle_dataset(pickle_path)}")
@@ -4,24 +4,32 @@ Generate profiling datasets by reusing GAIA's run_experiment logic.
 For each (scheduling_policy, carbon_policy) combination, sample random start indices
 and task subsets, simulate 48h runs, and extract d_power & waiting_time.
 """
-import os, copy
+import os
+import glob
 import random
 import pickle
-from typing import List, Tuple
+from typing import Dict, Iterable, List, Tuple
 import multiprocessing as mp
 from tqdm import tqdm
 
 import numpy as np
 
-from carbon import get_carbon_model
-from task import Task, set_waiting_times, load_tasks, TIME_FACTOR
-from scheduling import create_scheduler
+from carbon import get_carbon_model, load_carbon_trace
+from task import TaskTable, set_waiting_times, load_tasks, TIME_FACTOR
+from scheduling import create_scheduler, solve_start_times, START_TIME_POLICIES, UNCONSTRAINED_POLICIES
 from cluster import create_cluster
+from dataset_store import SUFFIX, columnar_path, write_columnar_dataset
 
 DURATION_HOURS = 48
 DURATION_TICKS = int(DURATION_HOURS * 3600 // TIME_FACTOR)
 WINDOW_TICKS = int((5*60) // TIME_FACTOR)
 NUM_WINDOWS = DURATION_TICKS // WINDOW_TICKS
+# window sizes (in ticks) the per-window metrics can additionally be reported at
+RESOLUTIONS = {
+    "5min": WINDOW_TICKS,
+    "hourly": int(3600 // TIME_FACTOR),
+    "daily": int(24 * 3600 // TIME_FACTOR),
+}
 UNLIMITED_CPUS = 10**9
 
 SCHED_POLICIES = ["carbon", "carbon-cost", "suspend-resume", "suspend-resume-threshold", "edd"]
@@ -36,38 +44,91 @@ BASELINE_POLICIES = [
     "edd_fixed",
 ]
 
-ALL_TASKS: List[Task] = []
+ALL_TASKS: TaskTable = None
 END_OF_DAY = 24 * 3600 // TIME_FACTOR
 WAITING_STR: str = "0x0"
 CARBON_TRACE: str = "AU-SA"
+SEED: int = 0
+# names of RESOLUTIONS reported in results besides the WINDOW_TICKS series
+EXTRA_RESOLUTIONS: List[str] = []
+# results per shard file before a new one is started
+SHARD_SIZE = 500
 
-def init_worker(tasks: List[Task], carbon_trace: str, waiting_str: str):
+def init_worker(tasks: TaskTable, carbon_trace: str, waiting_str: str,
+                num_tasks: int, reserve_instances: int, seed: int = 0, resolutions=()):
     """
-    Setup global task list and compute valid start index range for 2-day windows.
+    Setup the global task list and run configuration of a worker process.
     """
-    global ALL_TASKS, MAX_START, WAITING_STR, CARBON_TRACE
+    global ALL_TASKS, WAITING_STR, CARBON_TRACE, k, RESERVED_INSTANCES, SEED, EXTRA_RESOLUTIONS
     ALL_TASKS = tasks
     WAITING_STR = waiting_str
     CARBON_TRACE = carbon_trace
+    k = num_tasks
+    RESERVED_INSTANCES = reserve_instances
+    SEED = seed
+    EXTRA_RESOLUTIONS = list(resolutions)
+
+def sample_seed(sched: str, cpol: str, index: int) -> str:
+    """Seed of one sample, so a sample is the same whichever worker runs it and when"""
+    return f"{SEED}/{sched}_{cpol}/{index}"
+
+def make_sample(tasks: TaskTable, indices) -> TaskTable:
+    """
+    Read-only sample of the tasks at indices, with arrival times rebased into
+    [0, DURATION_TICKS) and rows in arrival order (ties keep the sampled order).
+    The loaded tasks are left untouched.
+    """
+    indices = np.asarray(indices, dtype=np.int64)
+    arrival_times = tasks.arrival_time[indices] % DURATION_TICKS
+    order = np.argsort(arrival_times, kind="stable")
+    sample = tasks.take(indices[order])
+    sample.arrival_time = arrival_times[order]
+    return sample.read_only()
+
+def next_event_time(current_time: int, next_arrival, scheduler, cluster) -> int:
+    """
+    Next tick at which the simulation state can change: an arrival, a queued job
+    becoming ready (or admissible), or the cluster releasing resources.
+    Ticks in between are no-ops for every scheduler and are skipped.
+    """
+    candidates = [
+        scheduler.next_event_time(current_time),
+        cluster.next_event_time(current_time),
+    ]
+    if next_arrival is not None:
+        candidates.append(next_arrival)
+    candidates = [t for t in candidates if t is not None]
+    if not candidates:
+        return current_time + 1
+    return max(current_time + 1, min(candidates))
 
 def simulate_sample(
     sched_policy: str,
     carbon_policy: str,
     carbon_start_idx: int,
-    tasks: List[Task],
+    tasks: TaskTable,
     waiting_str: str,
     reserve_instances: int,
     cpu_limits: List[int] = None,
+    allow_solver: bool = True,
 ) -> dict:
     """
-    Run a simulation for tasks whose arrival_time has been rebased to [0..DURATION_TICKS).
+    Run a simulation for a sample whose arrival_time has been rebased to [0..DURATION_TICKS)
+    (see make_sample). The sample is only read, so several runs can share it.
     Returns per-window mean usage and total waiting ticks.
+    Policies whose start times do not depend on cluster capacity are solved in
+    batch (see solve_start_times) unless allow_solver is False.
     """
     cm = get_carbon_model(CARBON_TRACE, carbon_start_index=carbon_start_idx)
     cm = cm.extend(3600 / TIME_FACTOR)
     set_waiting_times(waiting_str)
 
     exp_name = f"{sched_policy}-{carbon_policy}-{carbon_start_idx}-{random.getrandbits(32)}"
+    if allow_solver and sched_policy in UNCONSTRAINED_POLICIES:
+        # start times only depend on each task and the trace: no simulation needed
+        start_offsets = solve_start_times(START_TIME_POLICIES[carbon_policy], tasks, cm)
+        return sample_metrics([tasks], [start_offsets])[0]
+
     cluster = create_cluster(
         "simulation",
         sched_policy,
@@ -82,55 +143,33 @@ def simulate_sample(
     else:
         scheduler = create_scheduler(cluster, sched_policy, carbon_policy, cm)
 
+    arrival_times = tasks.arrival_time.tolist()
+    cursor = 0
     current_time = 0
     while True:
-        while len(tasks) > 0:
-            if tasks[0].arrival_time <= current_time:
-                if tasks[0].task_length > 0:
-                    scheduler.submit(current_time, tasks[0])
-                del tasks[0]
-            else:
-                break
+        while cursor < len(arrival_times) and arrival_times[cursor] <= current_time:
+            task = tasks[cursor]
+            if task.task_length > 0:
+                scheduler.submit(current_time, task)
+            cursor += 1
         with cluster.lock:
             scheduler.execute(current_time)
         cluster.sleep()
-        current_time += 1
-        if len(tasks) == 0 and scheduler.queue.empty():
+        if cursor == len(arrival_times) and scheduler.queue.empty():
             break
+        next_arrival = arrival_times[cursor] if cursor < len(arrival_times) else None
+        current_time = next_event_time(current_time, next_arrival, scheduler, cluster)
  
-    J_tick = [0] * DURATION_TICKS
-    for rec in cluster.details:
-        start = rec[8]
-        end = rec[10]
-        for t in range(start, min(end, DURATION_TICKS)):
-            J_tick[t] += 1
-
-    job_counts = [
-        sum(J_tick[w*WINDOW_TICKS : (w+1)*WINDOW_TICKS])
-        for w in range(NUM_WINDOWS)
-    ]
-
-    raw = cluster.runtime_allocation[:DURATION_TICKS]
-    cpu_windows = [
-        float(np.mean(raw[i*WINDOW_TICKS:(i+1)*WINDOW_TICKS]))
-        for i in range(NUM_WINDOWS)
-    ]
-    
-    total_wait = sum(r[9] for r in cluster.details)
-    scheduled_jobs = len(cluster.details)
-    total_wait = total_wait * TIME_FACTOR / 3600
-    
-    result = {
-        "windows": cpu_windows,
-        "total_wait": total_wait,
-        "job_counts": job_counts,
-        "scheduled_jobs": scheduled_jobs
-    }
-    return result
-
-def worker_task(args) -> dict:
-    sched, cpol = args
+    details = cluster.details
+    starts = details.column("start_time")
+    ends = details.column("exit_time")
+    waits = details.column("waiting_time").sum()
+    cpu_ticks = cluster.runtime_allocation[:DURATION_TICKS][None, :]
+    job_ticks = interval_ticks(np.zeros(len(starts), dtype=np.int64), starts, ends, 1, 1)
+    return window_metrics(cpu_ticks, job_ticks, [waits], [len(details)])[0]
 
+def draw_sample() -> Tuple[int, TaskTable]:
+    """Random carbon start index and task subset of one sample"""
     csi = random.randint(0, 8500)
 
     window_tasks = ALL_TASKS
@@ -139,19 +178,21 @@ def worker_task(args) -> dict:
     if len(window_tasks) < 10000:
         raise ValueError("Too few tasks in window, need at least 10000")
 
-    subset = random.sample(window_tasks, k)
-
-    for t in subset:
-        t.arrival_time = (t.arrival_time) % DURATION_TICKS
+    subset = make_sample(window_tasks, random.sample(range(len(window_tasks)), k))
+    return csi, subset
 
-    subset.sort(key=lambda x: x.arrival_time)
-
-    tasks_for_base = copy.deepcopy(subset)
-    tasks_for_policy = copy.deepcopy(subset)
+def simulate_baseline(csi: int, subset: TaskTable) -> dict:
+    """
+    The no-wait run every policy of a sample is compared against. It makes no
+    scheduling decisions, so it is evaluated analytically; equivalent to
+    simulate_sample("carbon", "waiting", csi, subset, '0x0', UNLIMITED_CPUS).
+    """
+    # the simulated run drew its experiment name here; keep the sample's RNG stream
+    random.getrandbits(32)
+    return analytic_baselines([subset])[0]
 
-    nowait_result = simulate_sample(
-        "carbon", "waiting", csi, tasks_for_base, '0x0', UNLIMITED_CPUS
-    )
+def evaluate_policy(sched: str, cpol: str, csi: int, subset: TaskTable, nowait_result: dict) -> dict:
+    """Simulate a policy on a sample and compare it with the sample's baseline"""
     base_usage, base_wait, J_window_b = nowait_result["windows"], nowait_result["total_wait"], nowait_result["job_counts"]
     scheduled_jobs = nowait_result["scheduled_jobs"]
 
@@ -170,11 +211,11 @@ def worker_task(args) -> dict:
             cpu_limits.append(next_cpu)
             
         policy_result = simulate_sample(
-            sched, cpol, csi, tasks_for_policy, WAITING_STR, RESERVED_INSTANCES, cpu_limits
+            sched, cpol, csi, subset, WAITING_STR, RESERVED_INSTANCES, cpu_limits
         )
     else:
         policy_result = simulate_sample(
-            sched, cpol, csi, tasks_for_policy, WAITING_STR, RESERVED_INSTANCES
+            sched, cpol, csi, subset, WAITING_STR, RESERVED_INSTANCES
         )
     pol_usage, pol_wait, J_window = policy_result["windows"], policy_result["total_wait"], policy_result["job_counts"]
     pol_scheduled_jobs = policy_result["scheduled_jobs"]
@@ -196,8 +237,250 @@ def worker_task(args) -> dict:
         "scheduled_jobs": scheduled_jobs,
         "pol_scheduled_jobs": pol_scheduled_jobs
     }
+    if "resolutions" in policy_result:
+        result["resolutions"] = {}
+        for name, pol in policy_result["resolutions"].items():
+            base = nowait_result["resolutions"][name]
+            result["resolutions"][name] = {
+                "d_power": [p - b for p, b in zip(pol["windows"], base["windows"])],
+                "base_usage": base["windows"],
+                "pol_usage": pol["windows"],
+                "base_job_counts": base["job_counts"],
+                "job_counts": pol["job_counts"],
+            }
     return result
 
+def interval_ticks(rows: np.ndarray, starts: np.ndarray, stops: np.ndarray, weights, num_rows: int) -> np.ndarray:
+    """
+    (num_rows, DURATION_TICKS) per-tick totals of weights[i] held over
+    [starts[i], stops[i]) in row rows[i], cut at the end of the simulated duration.
+    """
+    diff = np.zeros((num_rows, DURATION_TICKS + 1), dtype=np.int64)
+    weights = np.broadcast_to(np.asarray(weights, dtype=np.int64), starts.shape)
+    np.add.at(diff, (rows, np.minimum(starts, DURATION_TICKS)), weights)
+    np.add.at(diff, (rows, np.minimum(stops, DURATION_TICKS)), -weights)
+    return np.cumsum(diff[:, :DURATION_TICKS], axis=1)
+
+def window_sums(ticks: np.ndarray, window_ticks: int) -> np.ndarray:
+    """Per-row sums over consecutive windows of window_ticks ticks; a trailing partial window is dropped"""
+    end = ticks.shape[1] // window_ticks * window_ticks
+    return np.add.reduceat(ticks[:, :end], np.arange(0, end, window_ticks), axis=1)
+
+def window_metrics(cpu_ticks: np.ndarray, job_ticks: np.ndarray, waits, scheduled) -> List[dict]:
+    """
+    simulate_sample results from per-tick CPU usage and running-job counts (one row
+    per run) and each run's total waiting ticks and number of scheduled jobs:
+    mean CPU usage and job-tick totals per WINDOW_TICKS window, and per window of
+    every EXTRA_RESOLUTIONS size under "resolutions".
+    """
+    def windows(window_ticks):
+        return window_sums(cpu_ticks, window_ticks) / window_ticks, window_sums(job_ticks, window_ticks)
+
+    cpu_windows, job_counts = windows(WINDOW_TICKS)
+    extra = {name: windows(RESOLUTIONS[name]) for name in EXTRA_RESOLUTIONS}
+    results = []
+    for i in range(len(cpu_ticks)):
+        result = {
+            "windows": cpu_windows[i].tolist(),
+            "total_wait": int(waits[i]) * TIME_FACTOR / 3600,
+            "job_counts": job_counts[i].tolist(),
+            "scheduled_jobs": int(scheduled[i]),
+        }
+        if extra:
+            result["resolutions"] = {
+                name: {"windows": cpu[i].tolist(), "job_counts": jobs[i].tolist()}
+                for name, (cpu, jobs) in extra.items()
+            }
+        results.append(result)
+    return results
+
+def sample_metrics(samples: List[TaskTable], start_offsets: List[np.ndarray]) -> List[dict]:
+    """
+    simulate_sample results for many samples at once, in closed form, given every
+    task's start offset from its arrival: CPU usage (held over [start, start + length])
+    and running-job counts (over [start, start + length)) are interval adds reduced
+    per window.
+    """
+    runs = [sample.task_length > 0 for sample in samples]
+    rows = np.concatenate([np.full(np.count_nonzero(run), i, dtype=np.int64) for i, run in enumerate(runs)])
+    starts = np.concatenate([sample.arrival_time[run] + offsets[run]
+                             for sample, offsets, run in zip(samples, start_offsets, runs)])
+    lengths = np.concatenate([sample.task_length[run] for sample, run in zip(samples, runs)])
+    cpus = np.concatenate([sample.CPUs[run] for sample, run in zip(samples, runs)])
+    cpu_ticks = interval_ticks(rows, starts, starts + lengths + 1, cpus, len(samples))
+    job_ticks = interval_ticks(rows, starts, starts + lengths, 1, len(samples))
+    waits = [offsets[run].sum() for offsets, run in zip(start_offsets, runs)]
+    scheduled = [np.count_nonzero(run) for run in runs]
+    return window_metrics(cpu_ticks, job_ticks, waits, scheduled)
+
+def analytic_baselines(samples: List[TaskTable]) -> List[dict]:
+    """
+    simulate_sample results of the no-wait baseline ('0x0', UNLIMITED_CPUS) for many
+    samples at once: every task starts on its arrival tick.
+    """
+    return sample_metrics(samples, [np.zeros(len(sample), dtype=np.int64) for sample in samples])
+
+def worker_task(args) -> Tuple[int, dict]:
+    """One sample of one policy"""
+    sched, cpol, index = args
+    random.seed(sample_seed(sched, cpol, index))
+    csi, subset = draw_sample()
+    return index, evaluate_policy(sched, cpol, csi, subset, simulate_baseline(csi, subset))
+
+def worker_sample(args) -> Tuple[int, Dict[str, dict]]:
+    """
+    One sample evaluated under several policies: the sample is drawn and its
+    baseline simulated once, and every policy sees the same carbon start index
+    and tasks (common random numbers across the policies' datasets).
+    """
+    keys, index = args
+    random.seed(sample_seed("shared", "sample", index))
+    csi, subset = draw_sample()
+    nowait_result = simulate_baseline(csi, subset)
+    results = {}
+    for key in keys:
+        sched, cpol = key.split("_", 1)
+        random.seed(sample_seed(sched, cpol, index))
+        results[key] = evaluate_policy(sched, cpol, csi, subset, nowait_result)
+    return index, results
+
+def shard_records(shard_dir: str):
+    """(path, offset, record) of every complete record in the shards"""
+    for path in sorted(glob.glob(os.path.join(shard_dir, "shard-*.pkl"))):
+        with open(path, "rb") as f:
+            while True:
+                offset = f.tell()
+                try:
+                    record = pickle.load(f)
+                except (EOFError, pickle.UnpicklingError):
+                    break
+                yield path, offset, record
+
+def read_shards(shard_dir: str):
+    """
+    (index, result) records of a dataset being generated. A record cut short by an
+    interrupted run is ignored; its sample is simply generated again.
+    """
+    for _, _, record in shard_records(shard_dir):
+        yield record
+
+def ordered_results(shard_dir: str, num_samples: int):
+    """
+    Results of samples 0..num_samples-1 in index order. Records are located in a
+    first pass and then read back one at a time, so only one is held in memory.
+    """
+    positions = {}
+    for path, offset, (index, _) in shard_records(shard_dir):
+        if index < num_samples:
+            positions[index] = (path, offset)
+    files = {}
+    try:
+        for index in range(num_samples):
+            path, offset = positions[index]
+            if path not in files:
+                files[path] = open(path, "rb")
+            files[path].seek(offset)
+            yield pickle.load(files[path])[1]
+    finally:
+        for f in files.values():
+            f.close()
+
+def open_shards(shard_dir: str, config: dict) -> set:
+    """Create or reopen a shard directory; returns the sample indices already generated"""
+    os.makedirs(shard_dir, exist_ok=True)
+    manifest = os.path.join(shard_dir, "config.pkl")
+    if os.path.exists(manifest):
+        with open(manifest, "rb") as f:
+            if pickle.load(f) != config:
+                raise ValueError(f"{shard_dir} was generated with another configuration, remove it to start over")
+    else:
+        with open(manifest, "wb") as f:
+            pickle.dump(config, f)
+    return {index for index, _ in read_shards(shard_dir)}
+
+def stream_to_shards(pool, worker, jobs: list, shard_dir: str, desc: str):
+    """Run jobs on the pool, appending each (index, result) record as it completes"""
+    chunksize = max(1, min(16, len(jobs) // (4 * mp.cpu_count())))
+    shard = len(glob.glob(os.path.join(shard_dir, "shard-*.pkl")))
+    f = None
+    written = 0
+    try:
+        for record in tqdm(pool.imap_unordered(worker, jobs, chunksize=chunksize),
+                           total=len(jobs), desc=desc):
+            if f is None or written == SHARD_SIZE:
+                if f is not None:
+                    f.close()
+                f = open(os.path.join(shard_dir, f"shard-{shard:05d}.pkl"), "ab")
+                shard += 1
+                written = 0
+            pickle.dump(record, f)
+            f.flush()
+            written += 1
+    finally:
+        if f is not None:
+            f.close()
+
+def remove_shards(shard_dir: str):
+    for path in glob.glob(os.path.join(shard_dir, "*")):
+        os.remove(path)
+    os.rmdir(shard_dir)
+
+def dataset_path(output_dir: str, key: str, dataset_format: str = "pkl") -> str:
+    path = os.path.join(output_dir, f"{key}_dataset.pkl")
+    return columnar_path(path) if dataset_format == "columnar" else path
+
+def save_dataset(results: Iterable[dict], num_samples: int, out_f: str):
+    """
+    Write a dataset as a pickle, or in the columnar format if out_f is a columnar
+    path. The columnar format is written as results are produced; only a pickle
+    needs them all in memory at once.
+    """
+    if out_f.endswith(SUFFIX):
+        write_columnar_dataset(results, num_samples, out_f)
+    else:
+        with open(out_f + ".tmp", "wb") as f:
+            pickle.dump(list(results), f)
+        os.replace(out_f + ".tmp", out_f)
+    print(f"Saved {out_f}")
+
+def generate_dataset(pool, key: str, num_samples: int, output_dir: str, config: dict, dataset_format: str = "pkl"):
+    """
+    Generate num_samples samples of the sched_cpol policy key. Results are streamed
+    into append-only shards under {key}_dataset.shards as workers finish them, so an
+    interrupted run picks up the missing samples; the complete dataset is then
+    written to {key}_dataset.pkl (or .cols, see dataset_store) in sample order.
+    """
+    sched, cpol = key.split("_", 1)
+    shard_dir = os.path.join(output_dir, f"{key}_dataset.shards")
+    done = {index for index in open_shards(shard_dir, config) if index < num_samples}
+    if done:
+        print(f"Resuming {key}: {len(done)} of {num_samples} samples already generated")
+    jobs = [(sched, cpol, index) for index in range(num_samples) if index not in done]
+    stream_to_shards(pool, worker_task, jobs, shard_dir, f"Processing {key}")
+
+    save_dataset(ordered_results(shard_dir, num_samples), num_samples, dataset_path(output_dir, key, dataset_format))
+    remove_shards(shard_dir)
+
+def generate_shared_datasets(pool, keys: List[str], num_samples: int, output_dir: str, config: dict,
+                             dataset_format: str = "pkl"):
+    """
+    generate_dataset for several policies at once with worker_sample: each sample's
+    baseline is simulated once and shared by all the policies. Writes one dataset
+    per policy.
+    """
+    shard_dir = os.path.join(output_dir, "shared_dataset.shards")
+    done = {index for index in open_shards(shard_dir, dict(config, keys=list(keys))) if index < num_samples}
+    if done:
+        print(f"Resuming shared samples: {len(done)} of {num_samples} already generated")
+    jobs = [(keys, index) for index in range(num_samples) if index not in done]
+    stream_to_shards(pool, worker_sample, jobs, shard_dir, f"Processing {len(keys)} policies")
+
+    # one policy at a time, keeping only its result of each record as it is read
+    for key in keys:
+        results = (result[key] for result in ordered_results(shard_dir, num_samples))
+        save_dataset(results, num_samples, dataset_path(output_dir, key, dataset_format))
+    remove_shards(shard_dir)
+
 if __name__ == "__main__":
     import argparse
     parser = argparse.ArgumentParser("Generate GAIA datasets via wrapper")
@@ -213,84 +496,72 @@ if __name__ == "__main__":
                         help="Which policies to generate datasets for")
     parser.add_argument("-r", "--reserve-instances", type=int, default=UNLIMITED_CPUS,
                         help="Number of reserved instances for the cluster")
+    parser.add_argument("-s", "--seed", type=int, default=0,
+                        help="Base seed; every sample is seeded from it, its policy and its index")
+    parser.add_argument("--shared-baseline", action="store_true",
+                        help="Draw each sample once and evaluate every policy against one baseline run")
+    parser.add_argument("-f", "--format", choices=["pkl", "columnar"], default="pkl",
+                        help="Dataset file format; columnar datasets can be memory-mapped (see dataset_store)")
+    parser.add_argument("--resolutions", default="",
+                        help=f"Comma-separated extra window sizes to report, from {list(RESOLUTIONS)}")
 
     args = parser.parse_args()
 
-    global RESERVED_INSTANCES
-    RESERVED_INSTANCES = args.reserve_instances
-    global k
-    k = args.num_tasks
-    
     if args.ca:
         args.carbon_trace = "custom"
 
+    resolutions = [name.strip() for name in args.resolutions.split(",") if name.strip()]
+    for name in resolutions:
+        if name not in RESOLUTIONS:
+            raise ValueError(f"Unknown resolution {name}, expected one of {list(RESOLUTIONS)}")
+
     os.makedirs(args.output_dir, exist_ok=True)
     set_waiting_times(args.waiting_times)
     tasks = load_tasks(args.task_trace)
+    # convert the carbon trace once, before workers fork; they share the read-only mapping
+    load_carbon_trace(args.carbon_trace)
 
     print(f"Loaded {len(tasks)} tasks from {args.task_trace} trace")
-    print(f"Using carbon trace {args.carbon_trace} with waiting times {args.waiting_times} and {RESERVED_INSTANCES} reserved instances")
+    print(f"Using carbon trace {args.carbon_trace} with waiting times {args.waiting_times} and {args.reserve_instances} reserved instances")
 
     if args.policies == "all":
-        for sched in SCHED_POLICIES:
-            for cpol in CARBON_POLICIES:
-                key = f"{sched}_{cpol}"
-                print(f"Generating {key}: {args.num_samples} samples, each with {k} tasks")
-                pool = mp.Pool(
-                    processes=mp.cpu_count(),
-                    initializer=init_worker,
-                    initargs=(tasks, args.carbon_trace, args.waiting_times)
-                )
-                args_list = [(sched, cpol)] * args.num_samples
-                results = pool.map(worker_task, args_list)
-                pool.close(); pool.join()
-
-                out_f = os.path.join(args.output_dir, f"{key}_dataset.pkl")
-                with open(out_f, 'wb') as f:
-                    pickle.dump(results, f)
-                print(f"Saved {out_f}")
+        keys = [f"{sched}_{cpol}" for sched in SCHED_POLICIES for cpol in CARBON_POLICIES]
     elif args.policies == "baseline":
-        for key in BASELINE_POLICIES:
-            out_f = os.path.join(args.output_dir, f"{key}_dataset.pkl")
-            if os.path.exists(out_f):
-                print(f"Skipping {key}, already exists: {out_f}")
-                continue
-            print(f"Generating {key}: {args.num_samples} samples, each with {k} tasks")
-            pool = mp.Pool(
-                processes=mp.cpu_count(),
-                initializer=init_worker,
-                initargs=(tasks, args.carbon_trace, args.waiting_times)
-            )
-            sched, cpol = key.split("_", 1)
-            args_list = [(sched, cpol)] * args.num_samples
-            results = list(tqdm(pool.imap(worker_task, args_list), total=args.num_samples, desc=f"Processing {key}"))
-            pool.close(); pool.join()
-
-            out_f = os.path.join(args.output_dir, f"{key}_dataset.pkl")
-            with open(out_f, 'wb') as f:
-                pickle.dump(results, f)
-            print(f"Saved {out_f}")
+        keys = BASELINE_POLICIES
     else:
-        policies = args.policies
-        for key in policies.split(","):
-            key = key.strip()
+        keys = [key.strip() for key in args.policies.split(",")]
+        for key in keys:
             if key not in BASELINE_POLICIES:
                 raise ValueError(f"Unknown policy {key}, expected one of {BASELINE_POLICIES}")
             if "_" not in key:
                 raise ValueError("Invalid policy format, expected 'sched_cpol' format")
-            else:
-                print(f"Generating {key}: {args.num_samples} samples")
-                sched, cpol = key.split("_")
-
-                pool = mp.Pool(
-                    processes=mp.cpu_count(),
-                    initializer=init_worker,
-                    initargs=(tasks, args.carbon_trace, args.waiting_times)
-                )
-                args_list = [(sched, cpol)] * args.num_samples
-                results = pool.map(worker_task, args_list)
-                pool.close(); pool.join()
-                out_f = os.path.join(args.output_dir, f"{key}_dataset.pkl")
-                with open(out_f, 'wb') as f:
-                    pickle.dump(results, f)
-                print(f"Saved {out_f}")
\ No newline at end of file
+
+    config = {
+        "task_trace": args.task_trace,
+        "num_tasks": args.num_tasks,
+        "waiting_times": args.waiting_times,
+        "carbon_trace": args.carbon_trace,
+        "reserve_instances": args.reserve_instances,
+        "seed": args.seed,
+        "resolutions": resolutions,
+    }
+    # one pool for every policy; tasks are handed to each worker once
+    with mp.Pool(
+        processes=mp.cpu_count(),
+        initializer=init_worker,
+        initargs=(tasks, args.carbon_trace, args.waiting_times, args.num_tasks, args.reserve_instances, args.seed, resolutions),
+    ) as pool:
+        todo = []
+        for key in keys:
+            out_f = dataset_path(args.output_dir, key, args.format)
+            if args.policies == "baseline" and os.path.exists(out_f):
+                print(f"Skipping {key}, already exists: {out_f}")
+                continue
+            todo.append(key)
+        if args.shared_baseline:
+            print(f"Generating {', '.join(todo)}: {args.num_samples} shared samples, each with {args.num_tasks} tasks")
+            generate_shared_datasets(pool, todo, args.num_samples, args.output_dir, config, args.format)
+        else:
+            for key in todo:
+                print(f"Generating {key}: {args.num_samples} samples, each with {args.num_tasks} tasks")
+                generate_dataset(pool, key, args.num_samples, args.output_dir, config, args.format)
@@ -4,6 +4,7 @@ import pickle
 import pandas as pd
 import numpy as np
 from analysis_utils import inspect_row, plot_waiting_hist, plot_sample_d_powers, summarize_dataset, plot_sample_d_powers_colormap, load_dataset
+from analysis_utils import read_dataset, dataset_key, list_datasets
 from dgp import SCHED_POLICIES, CARBON_POLICIES, BASELINE_POLICIES
 
 import matplotlib.pyplot as plt
@@ -41,8 +42,7 @@ orig_cols = [
 
 def summary():
     dataset_dir = 'datasets'
-    files = sorted(f for f in os.listdir(dataset_dir) if f.endswith('_dataset.pkl'))
-    summaries = [summarize_dataset(os.path.join(dataset_dir, f)) for f in files]
+    summaries = [summarize_dataset(path) for path in list_datasets(dataset_dir)]
     df = pd.DataFrame(summaries)
     cols = [
         'dataset', 'samples',
@@ -73,6 +73,36 @@ def weighted_integral(J: np.ndarray, start: int, end: int) -> float:
     weights = (end - idx + 1).astype(float)
     return np.dot(J[idx], weights)
 
+def stack_series(data, name: str) -> np.ndarray:
+    """(N, T) float array of a time series of every sample"""
+    if hasattr(data, 'series'):
+        return np.array(data.series(name), dtype=float)
+    return np.array([sample[name] for sample in data], dtype=float)
+
+def row_sums(values: np.ndarray, counts: np.ndarray) -> np.ndarray:
+    """
+    Sum of values[i, :counts[i]] for every row i. Rows with the same count are
+    summed together, so each sum adds up in the same order as np.sum on the slice.
+    """
+    sums = np.zeros(len(values), dtype=float)
+    for count in np.unique(counts):
+        rows = np.flatnonzero(counts == count)
+        sums[rows] = values[rows, :count].sum(axis=1)
+    return sums
+
+def to_front(mask: np.ndarray, *arrays: np.ndarray) -> list:
+    """Per row, the entries of each array where mask holds moved to the front (in order)"""
+    order = np.argsort(~mask, axis=1, kind='stable')
+    return [np.take_along_axis(a, order, axis=1) for a in arrays]
+
+def sequential_row_sums(rows: np.ndarray, values: np.ndarray, num_rows: int) -> np.ndarray:
+    """Per row, values[rows == i] added one after the other, starting from 0.0"""
+    counts = np.bincount(rows, minlength=num_rows)
+    table = np.zeros((num_rows, counts.max(initial=0) + 1), dtype=float)
+    first = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    table[rows, np.arange(len(rows)) - first[rows]] = values
+    return np.cumsum(table, axis=1)[:, -1]
+
 def compute_features(
     data: list[dict],
     raw_features: bool = False,
@@ -85,96 +115,98 @@ def compute_features(
       - 'base_usage': list[float]
       - 'job_counts': list[int]
       - 'waiting_time': float
+    (or a dataset with series/scalar column access, see analysis_utils.read_dataset)
 
     raw_features: if True, returns element-wise d rather than engineered
     downsample: if True, first down-samples all three time series by 'downsample_factor'
+
+    All samples are processed at once as (N, T) arrays. Per sample, only the windows
+    where the baseline usage is positive count; those are moved to the front of each
+    row, so every feature is computed over the same values in the same order as
+    on that sample alone.
     """
     N = len(data)
     T = len(data[0]['d_power'])
-    y = np.zeros(N, dtype=float)
+
+    input_is_cpu = True
+
+    d = -stack_series(data, 'd_power')
+    U = stack_series(data, 'base_usage')
+    J = stack_series(data, 'job_counts')
+    if hasattr(data, 'scalar'):
+        y = np.array(data.scalar('waiting_time'), dtype=float)
+    else:
+        y = np.array([sample['waiting_time'] for sample in data], dtype=float)
+
+    if input_is_cpu:
+        U *= MW_PER_CORE
+        d *= MW_PER_CORE
+
+    if downsample:
+        new_len = T // downsample_factor
+        d = d[:, : new_len*downsample_factor].reshape(N, new_len, downsample_factor).mean(axis=2)
+        U = U[:, : new_len*downsample_factor].reshape(N, new_len, downsample_factor).mean(axis=2)
+        J = J[:, : new_len*downsample_factor].reshape(N, new_len, downsample_factor).sum(axis=2)
+
+    valid = (U > 0)
+    d, U, J = to_front(valid, d, U, J)
+    Tprime = valid.sum(axis=1)
+    inside = np.arange(d.shape[1]) < Tprime[:, None]
+    d = np.where(inside, d, 0.0)
+    U = np.where(inside, U, 1.0)
+    J = np.where(inside, J, 0.0)
 
     if raw_features:
-        H = T // downsample_factor if downsample else T
-        X = np.zeros((N, H), dtype=float)
+        X = d
     else:
         X = np.zeros((N, len(orig_cols)), dtype=float)
 
-    input_is_cpu = True
+        # 1) cum_wait_penalty
+        cum1 = np.cumsum(J * d / U, axis=1)
+        X[:, 0] = row_sums(np.maximum(cum1, 0.0), Tprime)
+
+        # 2) cum_delayed_power
+        cum2 = np.cumsum(d, axis=1)
+        X[:, 1] = row_sums(np.maximum(cum2, 0.0), Tprime)
+
+        # 3) convex_wait_penalty
+        cum3 = np.cumsum(J * (d**2) / U, axis=1)
+        X[:, 2] = row_sums(np.maximum(cum3, 0.0), Tprime)
+
+        # 4) jobs_affected
+        X[:, 3] = row_sums(J * np.maximum(d, 0.0) / U, Tprime)
+
+        # 5) tardiness penalty for jobs waiting longer than SLO
+        t = np.arange(d.shape[1])
+        tardiness = np.maximum(t - SLO, 0)
+        cum5 = np.cumsum(tardiness * J * d / U, axis=1)
+        X[:, 4] = row_sums(np.maximum(cum5, 0.0), Tprime)
+
+        # 6-8) suspension impact features, over the runs of positive d that
+        # directly follow a negative value (or open the series)
+        positive = np.pad(d > 0, ((0, 0), (1, 1)))
+        run_rows, starts = np.nonzero(positive[:, 1:-1] & ~positive[:, :-2])
+        _, ends = np.nonzero(positive[:, 1:-1] & ~positive[:, 2:])
+        counted = (starts == 0) | (d[run_rows, np.maximum(starts - 1, 0)] < 0)
+        run_rows, starts, ends = run_rows[counted], starts[counted], ends[counted]
+        duration = ends - starts + 1
+
+        jobs_affected_end = J[run_rows, np.maximum(ends - 1, 0)]
+        jobs_affected_start = J[run_rows, starts]
+
+        X[:, 8] = sequential_row_sums(run_rows, duration * jobs_affected_end, N)
+        X[:, 5] = sequential_row_sums(run_rows, duration * jobs_affected_start, N)
+        X[:, 6] = 0
+
+        # 7) degree_of_resumption
+        dropping = np.zeros_like(inside)
+        dropping[:, 1:] = (d[:, 1:] < 0) & (d[:, :-1] >= 0)
+        steps = np.zeros_like(d)
+        steps[:, 1:] = d[:, 1:] - d[:, :-1]
+        steps, = to_front(dropping, steps)
+        num_drops = dropping.sum(axis=1)
+        X[:, 7] = np.where(num_drops > 0, row_sums(steps, num_drops) / np.maximum(num_drops, 1), 0.0)
 
-    for i, sample in enumerate(data):
-        d = -np.array(sample['d_power'], dtype=float)
-        U = np.array(sample['base_usage'], dtype=float)
-        J = np.array(sample['job_counts'], dtype=float)
-        y[i] = sample['waiting_time']
-
-        if input_is_cpu:
-            U *= MW_PER_CORE
-            d *= MW_PER_CORE
-
-        if downsample:
-            new_len = T // downsample_factor
-            d = d[: new_len*downsample_factor].reshape(new_len, downsample_factor).mean(axis=1)
-            U = U[: new_len*downsample_factor].reshape(new_len, downsample_factor).mean(axis=1)
-            J = J[: new_len*downsample_factor].reshape(new_len, downsample_factor).sum(axis=1)
-
-        valid = (U > 0)
-        d, U, J = d[valid], U[valid], J[valid]
-        Tprime = len(d)
-
-        if raw_features:
-            row = np.zeros(X.shape[1], dtype=float)
-            row[:Tprime] = d
-            X[i, :] = row
-        else:
-            # 1) cum_wait_penalty
-            cum1 = np.cumsum(J * d / U)
-            X[i, 0] = np.sum(np.maximum(cum1, 0.0))
-
-            # 2) cum_delayed_power
-            cum2 = np.cumsum(d)
-            X[i, 1] = np.sum(np.maximum(cum2, 0.0))
-
-            # 3) convex_wait_penalty
-            cum3 = np.cumsum(J * (d**2) / U)
-            X[i, 2] = np.sum(np.maximum(cum3, 0.0))
-
-            # 4) jobs_affected
-            X[i, 3] = np.sum(J * np.maximum(d, 0.0) / U)
-
-            # 5) tardiness penalty for jobs waiting longer than SLO
-            t = np.arange(len(d))
-            tardiness = np.maximum(t - SLO, 0)
-            cum5 = np.cumsum(tardiness * J * d / U)
-            X[i, 4] = np.sum(np.maximum(cum5, 0.0))
-
-            # 6-8) suspension impact features
-            suspension_impact_e = 0.0
-            suspension_impact_s = 0.0
-            t = 0
-            while t < Tprime:
-                if d[t] > 0 and (t == 0 or d[t - 1] < 0):
-                    start = t
-                    while t < Tprime and d[t] > 0:
-                        t += 1
-                    end = t - 1
-                    duration = end - start + 1
-                    
-                    jobs_affected_end = J[end-1] if end > 0 else J[0]
-                    jobs_affected_start = J[start]
-                    
-                    suspension_impact_e += duration * jobs_affected_end
-                    suspension_impact_s += duration * jobs_affected_start
-                else:
-                    t += 1
-            
-            X[i, 8] = suspension_impact_e
-            X[i, 5] = suspension_impact_s
-            X[i, 6] = 0
-
-            # 7) degree_of_resumption
-            drops = [d[t] - d[t - 1] for t in range(1, Tprime) if d[t] < 0 and d[t - 1] >= 0]
-            X[i, 7] = np.mean(drops) if drops else 0.0
-            
     if raw_features:
         cols = [f"raw_d_{t}" for t in range(X.shape[1])]
     else:
@@ -193,9 +225,8 @@ def fit_and_predict(file_path) -> dict:
     """
     Load dataset, compute features, fit Lasso, and return predictions.
     """
-    key = os.path.basename(file_path).replace('_dataset.pkl', '')
-    with open(file_path, 'rb') as f:
-        data = pickle.load(f)
+    key = dataset_key(file_path)
+    data = read_dataset(file_path)
     X, y = compute_features(data, raw_features=RAW_FEATURES, downsample=DOWN_SAMPLE)
 
     if POLY:
@@ -268,11 +299,10 @@ def fit_lasso_for_all_datasets(
     """
     Fit Lasso for each dataset in parallel, then plot y_pred vs y_true.
     """
-    files = sorted(
-        os.path.join(dataset_dir, f)
-        for f in os.listdir(dataset_dir)
-        if any(f.startswith(f"{sched}_{cpol}") for sched in SCHED_POLICIES for cpol in CARBON_POLICIES)
-    )
+    files = [
+        path for path in list_datasets(dataset_dir)
+        if any(dataset_key(path).startswith(f"{sched}_{cpol}") for sched in SCHED_POLICIES for cpol in CARBON_POLICIES)
+    ]
     
     args = [(fp, SLO_windows) for fp in files]
     with Pool(processes=processes) as pool:
@@ -322,12 +352,10 @@ def fit_and_evaluate_lasso_for_baseline(
     """
     Fit Lasso for BASELINE datasets in parallel, then plot y_pred vs y_true.
     """
-    files = sorted(
-        os.path.join(dataset_dir, f)
-        for f in os.listdir(dataset_dir)
-        if f.endswith('_dataset.pkl')
-        if any(f.startswith(f"{sched}") for sched in BASELINE_POLICIES)
-    )
+    files = [
+        path for path in list_datasets(dataset_dir)
+        if any(dataset_key(path).startswith(f"{sched}") for sched in BASELINE_POLICIES)
+    ]
     print(f"Found {len(files)} BASELINE datasets")
 
     args = [(fp,) for fp in files]
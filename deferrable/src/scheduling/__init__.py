@@ -4,6 +4,18 @@ from .scheduling_policy import SchedulingPolicy
 from .suspend_scheduling_policy import SuspendSchedulingPolicy
 from .edd_scheduling_policy import EDDSchedulingPolicy
 from .carbon_waiting_policy import best_waiting_time, lowest_carbon_slot, oracle_carbon_slot,oracle_carbon_slot_waiting,average_carbon_slot_waiting
+from .carbon_waiting_policy import solve_start_times
+
+START_TIME_POLICIES = {
+    "waiting": best_waiting_time,
+    "lowest": lowest_carbon_slot,
+    "oracle": oracle_carbon_slot,
+    "cst_oracle": oracle_carbon_slot_waiting,
+    "cst_average": average_carbon_slot_waiting,
+}
+
+# scheduling policies whose start times depend only on each job and the carbon trace
+UNCONSTRAINED_POLICIES = {"carbon", "carbon-spot"}
 
 
 def create_scheduler(cluster: BaseCluster, scheduling_policy: str, carbon_policy, carbon_model: CarbonModel, cpu_limits=None):
@@ -12,16 +24,8 @@ def create_scheduler(cluster: BaseCluster, scheduling_policy: str, carbon_policy
             raise ValueError("EDD scheduler requires cpu_limits parameter")
         return EDDSchedulingPolicy(cluster, cpu_limits)
         
-    if carbon_policy == "waiting":
-        start_time_policy = best_waiting_time
-    elif carbon_policy == "lowest":
-        start_time_policy = lowest_carbon_slot
-    elif carbon_policy == "oracle":
-        start_time_policy = oracle_carbon_slot
-    elif carbon_policy == "cst_oracle":
-        start_time_policy = oracle_carbon_slot_waiting
-    elif carbon_policy == "cst_average":
-        start_time_policy = average_carbon_slot_waiting
+    if carbon_policy in START_TIME_POLICIES:
+        start_time_policy = START_TIME_POLICIES[carbon_policy]
     else:
         raise Exception("Unknown Carbon Policy")
 
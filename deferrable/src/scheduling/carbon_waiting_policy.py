@@ -1,4 +1,6 @@
-from task import Task, TIME_FACTOR
+from collections import OrderedDict
+import numpy as np
+from task import Task, TIME_FACTOR, get_expected_time, get_expected_times
 from carbon import CarbonModel
 
 class Schedule:
@@ -16,64 +18,199 @@ class Schedule:
     def actual_finish_time(self, current_time):
         return current_time + self.finish_time
 
+# relative tolerance under which two carbon costs are treated as equal; prefix-sum
+# differences carry rounding noise, and equal costs must keep the earliest start
+COST_RTOL = 1e-9
+# spacing of the candidate start times searched by the oracle policies
+CANDIDATE_STEP = 3600 // TIME_FACTOR
+# bound on tasks x candidates scored at once by the batched searches
+BATCH_CELLS = 1 << 20
+
 def compute_carbon_consumption(task: Task, start_time: int, carbon_trace: CarbonModel) -> Schedule:
     """Compute Carbon Consumption with cyclical carbon data"""
-    trace_length = len(carbon_trace.df)
-    carbon_values = carbon_trace.df["carbon_intensity_avg"].values
-    
-    execution_carbon = []
-    for i in range(task.task_length):
-        idx = (start_time + i) % trace_length
-        execution_carbon.append(carbon_values[idx])
-    
-    carbon = sum(execution_carbon) * task.CPUs
+    carbon = carbon_trace.interval_sum(start_time, task.task_length) * task.CPUs
     return Schedule(start_time, start_time + task.task_length, carbon)
 
+def earliest_min(costs: np.ndarray, valid: np.ndarray = None) -> np.ndarray:
+    """Index (along the last axis) of the lowest cost, earliest among costs equal up to rounding"""
+    if valid is not None:
+        costs = np.where(valid, costs, np.inf)
+    best = costs.min(axis=-1, keepdims=True)
+    return np.argmax(costs <= best + COST_RTOL * np.abs(best), axis=-1)
+
+def earliest_best_saving(costs: np.ndarray, starts: np.ndarray, lengths, valid: np.ndarray = None) -> np.ndarray:
+    """Index (along the last axis) of the best carbon saving per unit of completion time,
+    where saving is measured against starting immediately (the first candidate)"""
+    immediate = costs[..., :1]
+    saving = immediate - costs
+    saving = np.where(np.abs(saving) <= COST_RTOL * np.abs(immediate), 0.0, saving)
+    rate = saving / (starts + lengths)
+    if valid is not None:
+        rate = np.where(valid, rate, -np.inf)
+    best = rate.max(axis=-1, keepdims=True)
+    return np.argmax(rate >= best - COST_RTOL * np.abs(best), axis=-1)
+
+def candidate_costs(task: Task, carbon_trace: CarbonModel, step: int):
+    """Carbon cost of every candidate start in [0, waiting_time], scored in one pass"""
+    starts = np.arange(0, task.waiting_time + 1, step)
+    costs = carbon_trace.window_sums(starts, task.task_length) * task.CPUs
+    return starts, costs
+
 def lowest_carbon_slot(task: Task, carbon_trace: CarbonModel) -> Schedule:
     """Lowest Carbon Slot Policy that picks the carbon slot with the lowest carbon intensity"""
     if task.waiting_time != 0:
-        start_time = carbon_trace.df[:task.waiting_time + 1]["carbon_intensity_avg"].idxmin()
+        start_time = carbon_trace.argmin(0, task.waiting_time + 1)
     else:
         start_time = 0
     return compute_carbon_consumption(task, start_time, carbon_trace)
 
-def oracle_carbon_slot(task: Task, carbon_trace: CarbonModel) -> Schedule:
+def oracle_carbon_slot(task: Task, carbon_trace: CarbonModel, step: int = CANDIDATE_STEP) -> Schedule:
     """Oracle Best Execution slot that uses the actual job length"""
-    schedules = []
-    for i in range(0, task.waiting_time + 1, 3600//TIME_FACTOR):
-        try:
-            s = compute_carbon_consumption(task, i, carbon_trace)
-            schedules.append(s)
-        except:
-            pass
-    schedule = min(schedules, key=lambda x: x.carbon_cost)
-    return schedule
+    starts, costs = candidate_costs(task, carbon_trace, step)
+    i = earliest_min(costs)
+    start_time = int(starts[i])
+    return Schedule(start_time, start_time + task.task_length, costs[i])
 
-def oracle_carbon_slot_waiting(task: Task, carbon_trace: CarbonModel) -> Schedule:
+def oracle_carbon_slot_waiting(task: Task, carbon_trace: CarbonModel, step: int = CANDIDATE_STEP) -> Schedule:
     """Oracle Carbon Saving per waiting time policy that uses the actual job length"""
-    schedules = []
-    CA = None
-    for i in range(0, task.waiting_time + 1, 3600//TIME_FACTOR):
-        try:
-            s = compute_carbon_consumption(task, i, carbon_trace)
-            schedules.append(s)            
-            if i == 0:
-                CA = s.carbon_cost
-        except:
-            pass
-    schedule = max(schedules, key=lambda x: (CA - x.carbon_cost)/(x.start_time+ task.task_length))
-    return schedule
+    starts, costs = candidate_costs(task, carbon_trace, step)
+    i = earliest_best_saving(costs, starts, task.task_length)
+    start_time = int(starts[i])
+    return Schedule(start_time, start_time + task.task_length, costs[i])
+
+def batched_oracle_search(lengths, cpus, waiting_times, carbon_trace: CarbonModel, step: int, origins, saving: bool):
+    lengths = np.asarray(lengths, dtype=np.int64)
+    cpus = np.asarray(cpus, dtype=np.int64)
+    waiting_times = np.asarray(waiting_times, dtype=np.int64)
+    origins = np.broadcast_to(np.asarray(origins, dtype=np.int64), lengths.shape)
+    start_times = np.zeros(len(lengths), dtype=np.int64)
+    carbon_costs = np.zeros(len(lengths), dtype=np.float64)
+    if len(lengths) == 0:
+        return start_times, carbon_costs
+    offsets = np.arange(0, waiting_times.max() + 1, step)
+    chunk = max(1, BATCH_CELLS // len(offsets))
+    for lo in range(0, len(lengths), chunk):
+        rows = slice(lo, lo + chunk)
+        starts = offsets[None, :]
+        valid = starts <= waiting_times[rows, None]
+        costs = carbon_trace.window_sums(origins[rows, None] + starts, lengths[rows, None]) * cpus[rows, None]
+        if saving:
+            best = earliest_best_saving(costs, starts, lengths[rows, None], valid)
+        else:
+            best = earliest_min(costs, valid)
+        start_times[rows] = offsets[best]
+        carbon_costs[rows] = costs[np.arange(len(best)), best]
+    return start_times, carbon_costs
+
+def oracle_carbon_slots(lengths, cpus, waiting_times, carbon_trace: CarbonModel, step: int = CANDIDATE_STEP, origins=0):
+    """
+    Batched oracle_carbon_slot: solves many tasks against the same trace at once.
+    Task i searches starts origins[i] + [0, waiting_times[i]]; returns the chosen
+    start offsets (relative to origins) and their carbon costs.
+    """
+    return batched_oracle_search(lengths, cpus, waiting_times, carbon_trace, step, origins, saving=False)
+
+def oracle_carbon_slots_waiting(lengths, cpus, waiting_times, carbon_trace: CarbonModel, step: int = CANDIDATE_STEP, origins=0):
+    """Batched oracle_carbon_slot_waiting, see oracle_carbon_slots"""
+    return batched_oracle_search(lengths, cpus, waiting_times, carbon_trace, step, origins, saving=True)
+
+class StartTimeCache:
+    """
+    Bounded LRU cache of start-time decisions made on the expected job length.
+    The decision only depends on the trace window and (expected_time, waiting_time),
+    not on the job itself, so jobs arriving on the same tick share it.
+    """
+
+    def __init__(self, maxsize: int = 4096) -> None:
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return self.entries[key]
+        self.misses += 1
+        return None
+
+    def put(self, key, start_time: int):
+        self.entries[key] = start_time
+        if len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def info(self) -> dict:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self.entries), "maxsize": self.maxsize}
+
+START_TIME_CACHE = StartTimeCache()
+
+def common_start_time(task: Task, carbon_trace: CarbonModel, policy) -> int:
+    """Start time that policy picks for a job of the task's expected length (cached)"""
+    expected_time = int(task.expected_time)
+    waiting_time = int(get_expected_time(expected_time)[1])
+    # windows past the end of a short trace wrap around, which depends on its length
+    span = min(len(carbon_trace), expected_time + waiting_time)
+    key = (policy.__name__, carbon_trace.trace_id, carbon_trace.offset, span, expected_time, waiting_time)
+    start_time = START_TIME_CACHE.get(key)
+    if start_time is None:
+        common_task = Task(task.ID, task.arrival_time, expected_time, task.CPUs)
+        start_time = policy(common_task, carbon_trace).start_time
+        START_TIME_CACHE.put(key, start_time)
+    return start_time
 
 def average_carbon_slot_waiting(task: Task, carbon_trace: CarbonModel) -> Schedule:
     """Carbon Saving per waiting time policy that uses the average job length"""
-    common_task = Task(task.ID, task.arrival_time, task.expected_time, task.CPUs)
-    common_schedule = oracle_carbon_slot_waiting(common_task, carbon_trace)
-    schedule = compute_carbon_consumption(task, common_schedule.start_time, carbon_trace)
+    start_time = common_start_time(task, carbon_trace, oracle_carbon_slot_waiting)
+    schedule = compute_carbon_consumption(task, start_time, carbon_trace)
     return schedule
 
 def best_waiting_time(task: Task, carbon_trace) -> Schedule:
     """Oracle Best Execution slot that uses the average job length"""
-    common_task = Task(task.ID, task.arrival_time, task.expected_time, task.CPUs)
-    common_schedule = oracle_carbon_slot(common_task, carbon_trace)
-    schedule = compute_carbon_consumption(task, common_schedule.start_time, carbon_trace)
-    return schedule
\ No newline at end of file
+    start_time = common_start_time(task, carbon_trace, oracle_carbon_slot)
+    schedule = compute_carbon_consumption(task, start_time, carbon_trace)
+    return schedule
+
+def solve_start_times(policy, tasks, carbon_trace: CarbonModel) -> np.ndarray:
+    """
+    Start offsets (from arrival) that a non cost-aware SchedulingPolicy using the
+    start-time policy gives every task of a TaskTable, solved in one batch. Each
+    task is scored on the window the policy would see at submission,
+    [arrival, arrival + max(length, expected) + waiting + 1); windows cut short by
+    the end of the trace wrap differently, so those tasks go through the policy.
+    """
+    arrivals = tasks.arrival_time
+    lengths = tasks.task_length
+    waiting_times = tasks.waiting_time
+    spans = np.maximum(lengths, tasks.expected_time) + waiting_times + 1
+    inside = arrivals + spans <= len(carbon_trace)
+    if policy in (best_waiting_time, average_carbon_slot_waiting):
+        # the search on the expected length must fit the window as well
+        expected_waits = get_expected_times(tasks.expected_time)[1]
+        inside &= tasks.expected_time + expected_waits < spans
+    starts = np.zeros(len(tasks), dtype=np.int64)
+    rows = np.flatnonzero(inside)
+
+    if policy is lowest_carbon_slot:
+        rows = rows[waiting_times[rows] != 0]
+        starts[rows] = carbon_trace.argmins(arrivals[rows], arrivals[rows] + waiting_times[rows] + 1) - arrivals[rows]
+    elif policy in (oracle_carbon_slot, oracle_carbon_slot_waiting):
+        search = oracle_carbon_slots if policy is oracle_carbon_slot else oracle_carbon_slots_waiting
+        starts[rows] = search(lengths[rows], tasks.CPUs[rows], waiting_times[rows], carbon_trace, origins=arrivals[rows])[0]
+    elif policy in (best_waiting_time, average_carbon_slot_waiting):
+        # the start picked for a job of the expected length, see common_start_time
+        search = oracle_carbon_slots if policy is best_waiting_time else oracle_carbon_slots_waiting
+        starts[rows] = search(tasks.expected_time[rows], tasks.CPUs[rows], expected_waits[rows], carbon_trace, origins=arrivals[rows])[0]
+    else:
+        raise ValueError(f"No batched solver for {policy.__name__}")
+
+    for i in np.flatnonzero(~inside):
+        task = tasks[i]
+        c_model = carbon_trace.subtrace(task.arrival_time, task.arrival_time + int(spans[i]))
+        starts[i] = policy(task, c_model).start_time
+    return starts
@@ -1,15 +1,75 @@
 from typing import List
+from bisect import insort
+from itertools import count
+import heapq
 from task import Task, TwoQueues
-from queue import PriorityQueue
 from cluster.base_cluster import BaseCluster
 
+_sequence = count()
+
 class EDDQueueObject:
     def __init__(self, task: Task, due_time: int) -> None:
         self.task = task
         self.due_time = due_time
-        
+        self.sequence = next(_sequence)
+
     def __lt__(self, other):
-        return self.due_time < other.due_time
+        return (self.due_time, self.sequence) < (other.due_time, other.sequence)
+
+class EDDQueue:
+    """Pending tasks in due-time order, tracking the smallest pending CPU demand"""
+
+    def __init__(self) -> None:
+        self.heap = []
+        self.demand_count = {}
+        self.demands: List[int] = []
+
+    def put(self, obj: EDDQueueObject):
+        heapq.heappush(self.heap, (obj.due_time, obj.sequence, obj))
+        cpus = obj.task.CPUs
+        if not self.demand_count.get(cpus):
+            self.demand_count[cpus] = 0
+            insort(self.demands, cpus)
+        self.demand_count[cpus] += 1
+
+    def empty(self) -> bool:
+        return not self.heap
+
+    def __len__(self):
+        return len(self.heap)
+
+    def min_demand(self):
+        return self.demands[0] if self.demands else None
+
+    def pop(self) -> EDDQueueObject:
+        obj = heapq.heappop(self.heap)[2]
+        cpus = obj.task.CPUs
+        self.demand_count[cpus] -= 1
+        if self.demand_count[cpus] == 0:
+            self.demands.remove(cpus)
+        return obj
+
+    def admit(self, headroom: int) -> List[EDDQueueObject]:
+        """
+        Remove and return the tasks EDD admits within headroom CPUs: walk in due
+        order and take every task that still fits, skipping over the ones that
+        do not. Stops as soon as no pending task can fit the remaining headroom.
+        """
+        admitted = []
+        skipped = []
+        while self.heap and self.demands[0] <= headroom:
+            # skipped tasks need more than the headroom, so the pending minimum
+            # always belongs to a task that has not been looked at yet
+            entry = self.heap[0]
+            if entry[2].task.CPUs <= headroom:
+                obj = self.pop()
+                headroom -= obj.task.CPUs
+                admitted.append(obj)
+            else:
+                skipped.append(heapq.heappop(self.heap))
+        for entry in skipped:
+            heapq.heappush(self.heap, entry)
+        return admitted
 
 class EDDSchedulingPolicy:
     def __init__(self, cluster: BaseCluster, cpu_limits: List[int]) -> None:
@@ -18,43 +78,45 @@ class EDDSchedulingPolicy:
         """
         self.cluster = cluster
         self.cpu_limits = cpu_limits
-        self.queue: PriorityQueue = PriorityQueue()
-        
+        self.queue: EDDQueue = EDDQueue()
+        # ticks at which a running task stops counting towards runtime_allocation
+        self.usage_drops: List[int] = []
+
     def submit(self, current_time: int, task: Task):
         """Submit task to EDD queue, sorted by due time (arrival + waiting_time)"""
         due_time = task.arrival_time + task.waiting_time
         self.queue.put(EDDQueueObject(task, due_time))
-        
+
     def execute(self, current_time: int):
         """Execute tasks in EDD order, respecting CPU limits"""
         if self.queue.empty():
             return
-            
+
         current_hour = current_time // 720
-        
+
         if current_hour >= len(self.cpu_limits):
-            temp_queue = PriorityQueue()
             while not self.queue.empty():
-                queue_obj = self.queue.get()
+                queue_obj = self.queue.pop()
                 self.cluster.submit(current_time, queue_obj.task)
             return
-            
+
         cpu_limit = self.cpu_limits[current_hour]
         current_cpu_usage = self.cluster.runtime_allocation[current_time] if current_time < len(self.cluster.runtime_allocation) else 0
-        
-        temp_queue = PriorityQueue()
-        scheduled_any = False
-        
-        while not self.queue.empty():
-            queue_obj = self.queue.get()
+
+        for queue_obj in self.queue.admit(cpu_limit - current_cpu_usage):
             task = queue_obj.task
-            
-            if current_cpu_usage + task.CPUs <= cpu_limit:
-                self.cluster.submit(current_time, task)
-                current_cpu_usage += task.CPUs
-                scheduled_any = True
-            else:
-                temp_queue.put(queue_obj)
-                
-        self.queue = temp_queue
-        self.cluster.refresh_data(current_time)
\ No newline at end of file
+            self.cluster.submit(current_time, task)
+            heapq.heappush(self.usage_drops, current_time + task.task_length + 1)
+
+        self.cluster.refresh_data(current_time)
+
+    def next_event_time(self, current_time: int):
+        """Earliest tick after current_time at which the CPU headroom can change"""
+        if self.queue.empty():
+            return None
+        while self.usage_drops and self.usage_drops[0] <= current_time:
+            heapq.heappop(self.usage_drops)
+        next_hour = (current_time // 720 + 1) * 720
+        if self.usage_drops:
+            return min(next_hour, self.usage_drops[0])
+        return next_hour
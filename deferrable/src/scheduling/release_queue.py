@@ -0,0 +1,113 @@
+import heapq
+from bisect import insort
+from typing import Dict, List
+
+
+class ReleaseQueue:
+    """Queued jobs indexed by the tick at which they have to start.
+
+    Plain heapq without locking: a tick only touches the jobs that are ready.
+    Entries are QueueObjects carrying max_start_time, priority and sequence.
+    """
+
+    def __init__(self) -> None:
+        self.heap = []
+        self.pending: Dict[int, object] = {}
+
+    def put(self, obj):
+        self.pending[obj.sequence] = obj
+        heapq.heappush(self.heap, (obj.max_start_time, obj.sequence, obj))
+
+    def remove(self, obj):
+        del self.pending[obj.sequence]
+
+    def empty(self) -> bool:
+        return not self.pending
+
+    def __len__(self):
+        return len(self.pending)
+
+    def next_start_time(self):
+        """Earliest max_start_time among queued jobs"""
+        while self.heap and self.heap[0][1] not in self.pending:
+            heapq.heappop(self.heap)
+        return self.heap[0][0] if self.heap else None
+
+    def take_ready(self, current_time: int) -> List[object]:
+        """Jobs whose max_start_time has passed, in priority order.
+
+        They are dropped from the time index but stay pending until removed.
+        """
+        ready = []
+        while self.heap and self.heap[0][0] <= current_time:
+            _, sequence, obj = heapq.heappop(self.heap)
+            if sequence in self.pending:
+                ready.append(obj)
+        ready.sort(key=lambda obj: (obj.priority, obj.sequence))
+        return ready
+
+    def pop_ready(self, current_time: int) -> List[object]:
+        """Remove and return jobs whose max_start_time has passed, in priority order"""
+        ready = self.take_ready(current_time)
+        for obj in ready:
+            self.remove(obj)
+        return ready
+
+
+class CostAwareQueue(ReleaseQueue):
+    """ReleaseQueue with a secondary index by CPU demand.
+
+    Jobs that may be admitted early on reserved instances are bucketed by
+    their CPUs, so the jobs fitting the available instances are found without
+    scanning the whole queue.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.buckets: Dict[int, List[object]] = {}
+        self.bucket_size: Dict[int, int] = {}
+        self.indexed = set()
+        self.demands: List[int] = []
+
+    def put(self, obj, admissible: bool = True):
+        super().put(obj)
+        if not admissible:
+            return
+        cpus = obj.task.CPUs
+        if not self.bucket_size.get(cpus):
+            self.bucket_size[cpus] = 0
+            self.buckets[cpus] = []
+            insort(self.demands, cpus)
+        self.buckets[cpus].append(obj)
+        self.bucket_size[cpus] += 1
+        self.indexed.add(obj.sequence)
+
+    def remove(self, obj):
+        super().remove(obj)
+        if obj.sequence in self.indexed:
+            # bucket entries are purged lazily when the bucket is scanned
+            self.indexed.remove(obj.sequence)
+            cpus = obj.task.CPUs
+            self.bucket_size[cpus] -= 1
+            if self.bucket_size[cpus] == 0:
+                self.demands.remove(cpus)
+
+    def min_demand(self):
+        """Smallest CPU demand among jobs that can be admitted early"""
+        return self.demands[0] if self.demands else None
+
+    def candidates(self, current_time: int, available: int) -> List[object]:
+        """Ready jobs and jobs fitting the available instances, in priority order.
+
+        Ready jobs are dropped from the time index (see take_ready), so the
+        caller must submit and remove all of them.
+        """
+        candidates = {obj.sequence: obj for obj in self.take_ready(current_time)}
+        for cpus in self.demands:
+            if cpus > available:
+                break
+            bucket = [obj for obj in self.buckets[cpus] if obj.sequence in self.indexed]
+            self.buckets[cpus] = bucket
+            for obj in bucket:
+                candidates[obj.sequence] = obj
+        return sorted(candidates.values(), key=lambda obj: (obj.priority, obj.sequence))
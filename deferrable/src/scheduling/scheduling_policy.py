@@ -1,18 +1,24 @@
 from typing import Callable
+from itertools import count
 from carbon import CarbonModel
 from task import Task
 from .carbon_waiting_policy import Schedule
-from queue import PriorityQueue
+from .release_queue import ReleaseQueue, CostAwareQueue
 from cluster.base_cluster import BaseCluster
 
+_sequence = count()
+
 class QueueObject:
-    def __init__(self, task, max_start_time, priority) -> None:
+    def __init__(self, task, max_start_time, priority, schedule: Schedule = None) -> None:
         self.task = task
         self.max_start_time = max_start_time
         self.priority = priority
+        self.schedule = schedule
+        self.sequence = next(_sequence)
 
     def __lt__(self, other):
-        return self.priority < other.priority
+        # ties are served in submission order
+        return (self.priority, self.sequence) < (other.priority, other.sequence)
 
     def __str__(self):
         return str(self.x)
@@ -22,7 +28,7 @@ class SchedulingPolicy():
         self.cluster = cluster
         self.carbon_model: CarbonModel = carbon_model
         self.compute_start_time: Callable[[Task, CarbonModel], Schedule] = compute_start_time        
-        self.queue: PriorityQueue = PriorityQueue()
+        self.queue: ReleaseQueue = CostAwareQueue() if cost_aware else ReleaseQueue()
         self.carbon_aware = carbon_aware
         self.cost_aware = cost_aware
         self.spot_aware = spot_aware
@@ -34,27 +40,53 @@ class SchedulingPolicy():
                 c_model = self.carbon_model.subtrace(
                     current_time, current_time + max(task.task_length, task.expected_time) + task.waiting_time + 1)
                 schedule = self.compute_start_time(task, c_model)
-                self.queue.put(QueueObject(
-                    task, schedule.actual_start_time(current_time), task.arrival_time))
+                self.enqueue(QueueObject(
+                    task, schedule.actual_start_time(current_time), task.arrival_time, schedule))
             except:
                 print("RealClusterCost: Submit Error")
                 raise
         else:
-            self.queue.put(QueueObject(
+            self.enqueue(QueueObject(
                 task, task.waiting_time + current_time, task.arrival_time))
 
+    def enqueue(self, queue_object: QueueObject):
+        if self.cost_aware:
+            admissible = not self.spot_aware or queue_object.task.task_length_class != "0-2"
+            self.queue.put(queue_object, admissible)
+        else:
+            self.queue.put(queue_object)
+
     def execute(self, current_time):
         """Submit ready job to the simulated or real cluster queue"""
-        queue = PriorityQueue()
-        while not self.queue.empty():
-            queue_object = self.queue.get()
-            if current_time >= queue_object.max_start_time:
-                self.cluster.submit(current_time, queue_object.task)
-            elif self.cost_aware and not self.spot_aware and self.cluster.available_reserved_instances >= queue_object.task.CPUs:
-                self.cluster.submit(current_time, queue_object.task)
-            elif self.cost_aware and self.spot_aware and queue_object.task.task_length_class != "0-2" and self.cluster.available_reserved_instances >= queue_object.task.CPUs:
-                self.cluster.submit(current_time, queue_object.task)
-            else:
-                queue.put(queue_object)
-        self.queue = queue
-        self.cluster.refresh_data(current_time)
\ No newline at end of file
+        if self.cost_aware:
+            candidates = self.queue.candidates(current_time, self.cluster.available_reserved_instances)
+            for queue_object in candidates:
+                if current_time >= queue_object.max_start_time or self.fits_reserved(queue_object.task):
+                    self.queue.remove(queue_object)
+                    self.cluster.submit(current_time, queue_object.task, self.planned_schedule(current_time, queue_object))
+        else:
+            for queue_object in self.queue.pop_ready(current_time):
+                self.cluster.submit(current_time, queue_object.task, self.planned_schedule(current_time, queue_object))
+        self.cluster.refresh_data(current_time)
+
+    def planned_schedule(self, current_time, queue_object: QueueObject):
+        """The schedule computed at submission, if the job starts when it planned to"""
+        if current_time == queue_object.max_start_time:
+            return queue_object.schedule
+        return None
+
+    def fits_reserved(self, task: Task) -> bool:
+        """Whether a cost-aware policy would admit the task before its start time"""
+        if not self.cost_aware or self.cluster.available_reserved_instances < task.CPUs:
+            return False
+        return not self.spot_aware or task.task_length_class != "0-2"
+
+    def next_event_time(self, current_time):
+        """Earliest tick after current_time at which execute can submit a queued job"""
+        if self.queue.empty():
+            return None
+        if self.cost_aware:
+            min_demand = self.queue.min_demand()
+            if min_demand is not None and min_demand <= self.cluster.available_reserved_instances:
+                return current_time + 1
+        return self.queue.next_start_time()
\ No newline at end of file
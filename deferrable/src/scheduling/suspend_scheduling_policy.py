@@ -1,19 +1,22 @@
 from typing import Callable
+from itertools import count
 from carbon import CarbonModel
-from task import TIME_FACTOR, Task
-from queue import PriorityQueue
+from task import TIME_FACTOR, Task, Segment
 from cluster.base_cluster import BaseCluster
-import pandas as pd
+from .release_queue import ReleaseQueue
 import numpy as np
 
+_sequence = count()
+
 class QueueObject:
-    def __init__(self, task: Task, max_start_time: int, priority: float) -> None:
+    def __init__(self, task: Segment, max_start_time: int, priority: float) -> None:
         self.task = task
         self.max_start_time = max_start_time
         self.priority = priority
+        self.sequence = next(_sequence)
 
     def __lt__(self, other):
-        return self.priority < other.priority
+        return (self.priority, self.sequence) < (other.priority, other.sequence)
 
     def __str__(self):
         return f"QueueObject(task={self.task.ID}, max_start={self.max_start_time}, pri={self.priority})"
@@ -27,28 +30,29 @@ class SuspendSchedulingPolicy:
     def __init__(self, cluster: BaseCluster, carbon_model: CarbonModel, optimal: bool) -> None:
         self.cluster = cluster
         self.carbon_model = carbon_model
-        self.queue: PriorityQueue = PriorityQueue()
+        self.queue: ReleaseQueue = ReleaseQueue()
         self.optimal = optimal
 
-    def compute_schedule_optimal(self, df: pd.DataFrame, task: Task) -> list:
+    def compute_schedule_optimal(self, carbon: np.ndarray, task: Task) -> np.ndarray:
         """
-        WaitAwhile: within the first (J + W) slots of df['carbon_intensity_avg'],
-        pick the J lowest-carbon slots and schedule them in time order.
+        WaitAwhile: within the first (J + W) slots of the carbon trace,
+        pick the J lowest-carbon slots (earliest first among equal ones).
         """
         J = task.task_length
         W = task.waiting_time
         window_len = J + W
-        arr = df['carbon_intensity_avg'].iloc[:window_len].to_numpy()
+        arr = carbon[:window_len]
         if arr.shape[0] < window_len:
             raise RuntimeError(f"Insufficient carbon data: need {window_len}, got {arr.shape[0]}")
-        idxs = np.argsort(arr, kind='stable')[:J]
-        slots = sorted(int(i) for i in idxs)
-        schedule = [0] * window_len
-        for t in slots:
-            schedule[t] = 1
+        schedule = np.ones(window_len, dtype=bool)
+        if J < window_len:
+            kth = np.partition(arr, J - 1)[J - 1]
+            schedule = arr < kth
+            ties = np.flatnonzero(arr == kth)[:J - np.count_nonzero(schedule)]
+            schedule[ties] = True
         return schedule
 
-    def compute_schedule_threshold(self, df: pd.DataFrame, task: Task, threshold: float) -> list:
+    def compute_schedule_threshold(self, carbon: np.ndarray, task: Task, threshold: float) -> np.ndarray:
         """
         Ecovisor: run when carbon < threshold; else wait until threshold or W expires,
         then run continuously to finish J units.
@@ -56,21 +60,15 @@ class SuspendSchedulingPolicy:
         J = task.task_length
         W = task.waiting_time
         window_len = J + W
-        arr = df['carbon_intensity_avg'].iloc[:window_len].to_numpy()
+        arr = carbon[:window_len]
         if arr.shape[0] < window_len:
             raise RuntimeError(f"Insufficient carbon data: need {window_len}, got {arr.shape[0]}")
-        schedule = [0] * window_len
-        rem_wait = W
-        rem_job = J
-        for t, ci in enumerate(arr):
-            if rem_job <= 0:
-                break
-            if ci < threshold or rem_wait <= 0:
-                schedule[t] = 1
-                rem_job -= 1
-            else:
-                rem_wait -= 1
-        if rem_job > 0:
+        # a slot above the threshold is waited out while waiting budget remains
+        above = ~(arr < threshold)
+        schedule = ~(above & (np.cumsum(above) <= W))
+        # the job is done after its J-th running slot
+        schedule &= np.cumsum(schedule) <= J
+        if np.count_nonzero(schedule) < J:
             raise RuntimeError(f"Cannot fit job (length {J}) within deadline W={W}")
         return schedule
 
@@ -78,56 +76,35 @@ class SuspendSchedulingPolicy:
         """Split Task into sub-tasks according to computed schedule and enqueue."""
         try:
             horizon = task.task_length + task.waiting_time
-            trace_df = self.carbon_model.subtrace(
-                current_time, current_time + horizon
-            ).df
+            trace = self.carbon_model.window(current_time, current_time + horizon)
             if self.optimal:
-                schedule = self.compute_schedule_optimal(trace_df, task)
+                schedule = self.compute_schedule_optimal(trace, task)
             else:
                 lookahead = int(3600 / TIME_FACTOR * 24)
-                threshold = self.carbon_model.df[
-                    current_time : current_time + lookahead
-                ]['carbon_intensity_avg'].quantile(0.3)
-                schedule = self.compute_schedule_threshold(trace_df, task, threshold)
-
-            sub_tasks = []
-            start_times = []
-            prev_end = 0
-            i = 0
-            while i < len(schedule):
-                if schedule[i] == 0:
-                    i += 1
-                    continue
-                start = i
-                while i < len(schedule) and schedule[i] == 1:
-                    i += 1
-                length = i - start
+                threshold = self.carbon_model.rolling_quantile(lookahead, 0.3)[current_time]
+                schedule = self.compute_schedule_threshold(trace, task, threshold)
 
-                scheduled_wait = start - prev_end
-                
-                sub = Task(task.ID, current_time + start, length, task.CPUs)
-                sub.scheduled_wait = scheduled_wait
-                prev_end = i
+            # runs of consecutive slots become sub-tasks
+            edges = np.diff(schedule.astype(np.int8), prepend=0, append=0)
+            starts = np.flatnonzero(edges == 1)
+            ends = np.flatnonzero(edges == -1)
+            waits = starts - np.concatenate(([0], ends[:-1]))
 
-                if not self.optimal:
-                    sub.task_length_class = task.task_length_class
-                sub_tasks.append(sub)
-                start_times.append(start)
-
-            for sub, offset in zip(sub_tasks, start_times):
-                self.queue.put(QueueObject(sub, current_time + offset, sub.arrival_time))
+            for start, end, scheduled_wait in zip(starts.tolist(), ends.tolist(), waits.tolist()):
+                length_class = None if self.optimal else task.task_length_class
+                sub = Segment(task, current_time + start, end - start, scheduled_wait, length_class)
+                self.queue.put(QueueObject(sub, current_time + start, sub.arrival_time))
         except Exception as e:
             print(f"SuspendSchedulingPolicy error: {e}")
             raise
 
     def execute(self, current_time: int):
         """Submit ready sub-tasks whose start time has arrived."""
-        next_queue = PriorityQueue()
-        while not self.queue.empty():
-            obj = self.queue.get()
-            if current_time >= obj.max_start_time:
-                self.cluster.submit(current_time, obj.task)
-            else:
-                next_queue.put(obj)
-        self.queue = next_queue
-        self.cluster.refresh_data(current_time)
\ No newline at end of file
+        ready = self.queue.pop_ready(current_time)
+        if ready:
+            self.cluster.submit_segments(current_time, [obj.task for obj in ready])
+        self.cluster.refresh_data(current_time)
+
+    def next_event_time(self, current_time: int):
+        """Earliest tick after current_time at which a queued sub-task becomes ready."""
+        return self.queue.next_start_time()
\ No newline at end of file
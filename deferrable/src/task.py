@@ -1,9 +1,14 @@
 from enum import Enum
+from collections.abc import Sequence
+import json
+import os
 import timeit
 from typing import List
+import numpy as np
 import pandas as pd
 
 TIME_FACTOR = 5
+TASK_CACHE_DIR = "src/cluster_traces/cache"
 
 waiting_times = None
 average_length = None
@@ -35,6 +40,10 @@ def get_expected_time(task_length_hours: float) -> (int, int, str):
     else:
         raise Exception("Not covered")
 
+LENGTH_CLASSES = ["0-2", "2-6", "6-12", "12-24", "24-48", "48+"]
+RESOURCE_CLASSES = ["1", "2", "3-4", "5-8", "9-16", "17-32", "33-64", "64+"]
+QUEUES = ["Same", TwoQueues.Short.name, TwoQueues.Long.name]
+
 def classify_time(length):
     """Map Task length to length class"""
     length = length / (3600/TIME_FACTOR)
@@ -85,11 +94,214 @@ class Task:
         self.waiting_time = int(waiting_time)
         self.scheduled_wait = None
 
-def load_tasks(trace_name:str) -> List[Task]:
-    """Load Task Trace"""
-    print(f"Started Loading Tasks for {trace_name}")
-    start = timeit.default_timer()
-    tasks = []
+class Segment:
+    """One run of a suspend-resume schedule, admitted in place of its parent Task"""
+    __slots__ = ("ID", "arrival_time", "task_length", "CPUs", "task_length_class", "CPUs_class", "scheduled_wait")
+
+    def __init__(self, task: Task, arrival_time: int, length: int, scheduled_wait: int, length_class: str = None) -> None:
+        self.ID = task.ID
+        self.arrival_time = arrival_time
+        self.task_length = length
+        self.CPUs = task.CPUs
+        self.task_length_class = length_class if length_class is not None else classify_time(length)
+        self.CPUs_class = task.CPUs_class
+        self.scheduled_wait = scheduled_wait
+
+    @property
+    def expected_time(self) -> int:
+        return int(get_expected_time(self.task_length)[0])
+
+def classify_times(lengths: np.ndarray) -> np.ndarray:
+    """classify_time over an array, as codes into LENGTH_CLASSES"""
+    hours = lengths / (3600/TIME_FACTOR)
+    return np.searchsorted([2, 4, 8, 16, 48], hours, side="left").astype(np.int8)
+
+def classify_resources_codes(cpus: np.ndarray) -> np.ndarray:
+    """classify_resources over an array, as codes into RESOURCE_CLASSES"""
+    codes = np.searchsorted([4, 8, 16, 32, 64], cpus, side="left") + 2
+    codes[cpus == 1] = 0
+    codes[cpus == 2] = 1
+    return codes.astype(np.int8)
+
+def get_expected_times(task_lengths: np.ndarray) -> (np.ndarray, np.ndarray, np.ndarray):
+    """get_expected_time over an array of task lengths; queues are codes into QUEUES"""
+    if len(waiting_times) == 1:
+        expected_times = np.full(len(task_lengths), 2.0)
+        waiting = np.full(len(task_lengths), waiting_times[0])
+        queues = np.zeros(len(task_lengths), dtype=np.int8)
+    elif len(waiting_times) == 2:
+        short = task_lengths < TwoQueues.Short.value
+        expected_times = np.where(short, average_length[0], average_length[1])
+        waiting = np.where(short, waiting_times[0], waiting_times[1])
+        queues = np.where(short, 1, 2).astype(np.int8)
+    else:
+        raise Exception("Not covered")
+    if not np.isfinite(expected_times).all():
+        raise ValueError("cannot convert float NaN to integer")
+    return expected_times.astype(np.int64), waiting.astype(np.int64), queues
+
+class TaskTable(Sequence):
+    """
+    Columnar task trace: one NumPy array per Task attribute, with the class labels
+    stored as small integer codes. Indexing yields lightweight TaskRow views.
+    """
+
+    RECORD_DTYPE = np.dtype([
+        ("ID", np.int64), ("arrival_time", np.int64), ("task_length", np.int64),
+        ("CPUs", np.int64), ("expected_time", np.int64), ("waiting_time", np.int64),
+        ("task_length_class", np.int8), ("CPUs_class", np.int8), ("queue", np.int8),
+    ])
+
+    def __init__(self, ID, arrival_time, task_length, CPUs, expected_time, waiting_time,
+                 task_length_class, CPUs_class, queue) -> None:
+        self.ID = ID
+        self.arrival_time = arrival_time
+        self.task_length = task_length
+        self.CPUs = CPUs
+        self.expected_time = expected_time
+        self.waiting_time = waiting_time
+        self.task_length_class = task_length_class
+        self.CPUs_class = CPUs_class
+        self.queue = queue
+
+    @classmethod
+    def from_arrays(cls, ids, arrival_times, task_lengths, CPUs) -> "TaskTable":
+        """Build the table the way Task.__init__ builds each task"""
+        task_lengths = np.asarray(task_lengths, dtype=np.float64)
+        CPUs = np.asarray(CPUs).astype(np.int64)
+        lengths = task_lengths.astype(np.int64)
+        expected_times, waiting, queues = get_expected_times(lengths)
+        return cls(
+            np.asarray(ids, dtype=np.int64),
+            np.asarray(arrival_times, dtype=np.float64).astype(np.int64),
+            lengths,
+            CPUs,
+            expected_times,
+            waiting,
+            classify_times(task_lengths),
+            classify_resources_codes(CPUs),
+            queues,
+        )
+
+    @classmethod
+    def from_records(cls, records: np.ndarray) -> "TaskTable":
+        """Table over the fields of a RECORD_DTYPE array (e.g. a memory-mapped cache)"""
+        return cls(*(records[name] for name in cls.RECORD_DTYPE.names))
+
+    def to_records(self) -> np.ndarray:
+        records = np.empty(len(self), dtype=self.RECORD_DTYPE)
+        for name, column in zip(self.RECORD_DTYPE.names, self.columns()):
+            records[name] = column
+        return records
+
+    def columns(self) -> list:
+        return [getattr(self, name) for name in self.RECORD_DTYPE.names]
+
+    def take(self, indices) -> "TaskTable":
+        """Table of the given rows, in the given order"""
+        return TaskTable(*(column[indices] for column in self.columns()))
+
+    def read_only(self) -> "TaskTable":
+        """Freeze the columns, so the table can be shared between simulations"""
+        for column in self.columns():
+            column.flags.writeable = False
+        return self
+
+    def copy(self) -> "TaskTable":
+        return TaskTable(*(column.copy() for column in self.columns()))
+
+    def __len__(self):
+        return len(self.ID)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self.take(index)
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("task index out of range")
+        return TaskRow(self, index)
+
+class TaskRow:
+    """Read-through view of one TaskTable row with the attributes of a Task"""
+    __slots__ = ("table", "index")
+
+    def __init__(self, table: TaskTable, index: int) -> None:
+        self.table = table
+        self.index = index
+
+    @property
+    def ID(self) -> int:
+        return int(self.table.ID[self.index])
+
+    @property
+    def arrival_time(self) -> int:
+        return int(self.table.arrival_time[self.index])
+
+    @property
+    def task_length(self) -> int:
+        return int(self.table.task_length[self.index])
+
+    @property
+    def CPUs(self) -> int:
+        return int(self.table.CPUs[self.index])
+
+    @property
+    def expected_time(self) -> int:
+        return int(self.table.expected_time[self.index])
+
+    @property
+    def waiting_time(self) -> int:
+        return int(self.table.waiting_time[self.index])
+
+    @property
+    def task_length_class(self) -> str:
+        return LENGTH_CLASSES[self.table.task_length_class[self.index]]
+
+    @property
+    def CPUs_class(self) -> str:
+        return RESOURCE_CLASSES[self.table.CPUs_class[self.index]]
+
+    @property
+    def queue(self) -> str:
+        return QUEUES[self.table.queue[self.index]]
+
+    @property
+    def scheduled_wait(self):
+        return None
+
+def task_cache_path(trace_name: str) -> str:
+    """Cache location for a trace preprocessed under the current TIME_FACTOR and waiting times"""
+    waiting = "x".join(f"{w * TIME_FACTOR / 3600:g}" for w in waiting_times)
+    return os.path.join(TASK_CACHE_DIR, f"{trace_name}-tf{TIME_FACTOR}-w{waiting}")
+
+def read_task_cache(path: str, signature: list):
+    """Memory-map a cached TaskTable, or None if it is missing or stale"""
+    try:
+        with open(f"{path}.json") as f:
+            meta = json.load(f)
+        if meta["source"] != signature:
+            return None
+        records = np.load(f"{path}.npy", mmap_mode="r")
+    except (OSError, ValueError, KeyError):
+        return None
+    set_average_length(meta["average_length"])
+    return TaskTable.from_records(records)
+
+def write_task_cache(path: str, signature: list, tasks: TaskTable):
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(f"{path}.npy.tmp", "wb") as f:
+            np.save(f, tasks.to_records())
+        os.replace(f"{path}.npy.tmp", f"{path}.npy")
+        with open(f"{path}.json.tmp", "w") as f:
+            json.dump({"source": signature, "average_length": [float(x) for x in average_length]}, f)
+        os.replace(f"{path}.json.tmp", f"{path}.json")
+    except OSError as e:
+        print(f"Could not cache tasks at {path}: {e}")
+
+def read_task_trace(trace_name: str) -> TaskTable:
+    """Parse a task trace csv into a TaskTable (sets the average lengths)"""
     df = pd.read_csv(f"src/cluster_traces/{trace_name}.csv")
 
     if trace_name in {"azure-100k", "mustang-trace-2015-100k", "pai-100k"}:
@@ -101,13 +313,24 @@ def load_tasks(trace_name:str) -> List[Task]:
     av_l = [df[df["length"] <= TwoQueues.Short.value]["length"].mean(),
             df[df["length"] >= TwoQueues.Short.value]["length"].mean()]
     set_average_length(av_l)
-    print(f"{trace_name} average {av_l[1]}")
-    
-    for id, row in df.iterrows():
-        if row["length"] < 300/TIME_FACTOR:
-            continue
-        assert row["length"] >= 300/TIME_FACTOR, "Too short Job"
-        tasks.append(Task(id, row["arrival_time"], row["length"], row["cpus"]))
-    
+
+    df = df[~(df["length"] < 300/TIME_FACTOR)]
+    return TaskTable.from_arrays(df.index, df["arrival_time"], df["length"], df["cpus"])
+
+def load_tasks(trace_name:str, use_cache: bool = True) -> TaskTable:
+    """Load Task Trace, from the preprocessed cache when it is up to date"""
+    print(f"Started Loading Tasks for {trace_name}")
+    start = timeit.default_timer()
+    stat = os.stat(f"src/cluster_traces/{trace_name}.csv")
+    signature = [stat.st_size, stat.st_mtime_ns]
+    path = task_cache_path(trace_name)
+
+    tasks = read_task_cache(path, signature) if use_cache else None
+    if tasks is None:
+        tasks = read_task_trace(trace_name)
+        if use_cache:
+            write_task_cache(path, signature, tasks)
+    print(f"{trace_name} average {average_length[1]}")
+
     print(f"Loading {trace_name} tasks took {timeit.default_timer()-start}")
-    return tasks
\ No newline at end of file
+    return tasks
@@ -0,0 +1,50 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import dgp
+from task import TaskTable, set_average_length, set_waiting_times
+
+CARBON_TRACE = "SYNTHETIC"
+
+@pytest.fixture
+def carbon_trace(tmp_path, monkeypatch):
+    """A random hourly carbon trace, long enough for any carbon start index dgp draws"""
+    os.makedirs(tmp_path / "src" / "traces")
+    rng = np.random.default_rng(0)
+    pd.DataFrame({"carbon_intensity_avg": rng.uniform(50, 500, 17544 + 8500 + 720)}).to_csv(
+        tmp_path / "src" / "traces" / f"{CARBON_TRACE}.csv", index=False)
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(dgp, "CARBON_TRACE", CARBON_TRACE)
+
+def make_tasks(seed: int, num_tasks: int = 300) -> TaskTable:
+    """Random tasks, including tasks of length 0 and tasks running past the simulated duration"""
+    rng = np.random.default_rng(seed)
+    set_average_length([100.0, 5000.0])
+    set_waiting_times("0x0")
+    arrivals = rng.integers(0, 2 * dgp.DURATION_TICKS, num_tasks)
+    lengths = rng.integers(0, 8000, num_tasks)
+    lengths[:5] = 0
+    arrivals[5:10] = dgp.DURATION_TICKS - rng.integers(1, 100, 5)
+    lengths[5:10] = rng.integers(200, 20000, 5)
+    cpus = rng.integers(1, 17, num_tasks)
+    return TaskTable.from_arrays(np.arange(num_tasks), arrivals, lengths, cpus)
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_analytic_baseline_matches_simulation(carbon_trace, seed):
+    tasks = make_tasks(seed)
+    sample = dgp.make_sample(tasks, np.random.default_rng(seed).permutation(len(tasks))[:200])
+    assert np.any(sample.arrival_time + sample.task_length >= dgp.DURATION_TICKS)
+    csi = 100 * seed
+
+    simulated = dgp.simulate_sample("carbon", "waiting", csi, sample, "0x0", dgp.UNLIMITED_CPUS, allow_solver=False)
+    solved = dgp.simulate_sample("carbon", "waiting", csi, sample, "0x0", dgp.UNLIMITED_CPUS)
+    analytic = dgp.analytic_baselines([sample])[0]
+
+    assert analytic == simulated
+    assert solved == simulated